@@ -1,9 +1,11 @@
 # Load modules
+import locale
 from pathlib import Path
 import pandas as pd
 
 import Scripts.config as config
 import Scripts.ProcessData_resampler as ProcessData
+import Scripts.DateTimes as DateTimes
 
 ### Generic script for importing files
 
@@ -18,19 +20,17 @@ def fileImport(dataset, folder, filename, pat):
     skiprows = config.config['info']['datasets'].query('dataset == "' + dataset + '" & folder == ' + str(folder))['skiprows'][dataset]
     # If file to be imported is of type of the 1st available filetype (xls)
     if pat == config.importer['filetypes'][0]:
-        # Read excel file
-        df = pd.read_excel(data_folder_path / filename, skiprows=skiprows)
+        # Read excel file (with any dtype and usecols set in the datasets sheet)
+        df = pd.read_excel(data_folder_path / filename, skiprows=skiprows, **ProcessData.readOptions(dataset, folder, 'excel'))
     # Else if file to be imported is of type of the 2nd available filetype (csv)
     elif pat == config.importer['filetypes'][1]:
-        # Open file temporarily to indentify encoding
-        with open(data_folder_path / filename) as csv_file:
-            enc = csv_file.encoding
-        # Read csv file
-        df = pd.read_csv(data_folder_path / filename, skiprows=skiprows, encoding = enc)
+        # Read csv file in the system's default encoding (with any dtype, usecols and engine set in the datasets sheet)
+        df = pd.read_csv(data_folder_path / filename, skiprows=skiprows, encoding = locale.getpreferredencoding(False),
+                         **ProcessData.readOptions(dataset, folder))
      # Else if file to be imported is of type of the 3rd available filetype (txt)
     elif pat == config.importer['filetypes'][2]:
         # Read text file with tab delimited separator
-        df = pd.read_csv(data_folder_path / filename, sep="\t", skiprows=skiprows)
+        df = pd.read_csv(data_folder_path / filename, sep="\t", skiprows=skiprows, **ProcessData.readOptions(dataset, folder))
     else:
         # If data file to be imported is none of those filetypes then raise and print an error
         raise ValueError("Unknown file type!")
@@ -56,12 +56,8 @@ preimport_functions = {'Test': get_Test_support_data}
 def mod_imported_TimeSeries_data(dataset, folder, filename, pat):
     # Import files
     df = fileImport(dataset, folder, filename, pat)
-    # Create combined DateTime column
-    df['DateTime'] = df['Date'] + " " + df['Time']
-    # Format as a datetime type
-    df['DateTime'] = pd.to_datetime(df['DateTime'], format='%d/%m/%Y %H:%M:%S')
-    # Set datetime timezone as UTC
-    df['DateTime'] = df['DateTime'].dt.tz_localize('UTC')
+    # Create DateTime column from the Date and Time columns, recorded in UTC
+    df['DateTime'] = DateTimes.parseDatetimes(df['Date'], tz='UTC', dt_format='%d/%m/%Y', times=df['Time'], time_format='%H:%M:%S')
 
     ### INSERT DATA MODIFIERS HERE ###
     ### To call supporting data use this code:
@@ -77,12 +73,9 @@ def mod_imported_SampleLog_data(dataset, folder, filename, pat):
     # Import file using above function
     df = fileImport(dataset, folder, filename, pat)
 
-    # Format DateTime column as a datetime type
-    df['DateTime'] = pd.to_datetime(df['DateTime'], format='%d/%m/%Y %H:%M')
-    # Set DateTime timezone to the timezone it was recorded in
-    df['DateTime'] = df['DateTime'].dt.tz_localize('Europe/London')
-    # Convert DateTime timezone to UTC (used throughout rest of script)
-    df['DateTime'] = df['DateTime'].dt.tz_convert('UTC')
+    # Format DateTime column as a datetime type from the timezone it was recorded in,
+    # converted to UTC (used throughout rest of script)
+    df['DateTime'] = DateTimes.parseDatetimes(df['DateTime'], tz='Europe/London', dt_format='%d/%m/%Y %H:%M')
 
     # Set read columns
     selected_read_cols = ['R1', 'R2', 'R3']
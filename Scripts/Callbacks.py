@@ -3,26 +3,47 @@ from dash import html
 from dash import dcc
 from dash.dependencies import Input, Output, State, ALL
 from dash.exceptions import PreventUpdate
-from dash_extensions.enrich import Output, Trigger
+from dash_extensions.enrich import Output
 import pandas as pd
 import re
 import dash_bootstrap_components as dbc
 from copy import deepcopy
-import time
 
 import Scripts.config as config
 import Scripts.Functions as func
+import Scripts.Jobs as Jobs
+
+def jobAlert(message, color, icon = "bi-exclamation-triangle-fill"):
+    return dbc.Alert([html.I(className="bi " + icon + " me-2"), message,],
+        color=color,
+        className="d-flex align-items-center mb-0 py-0")
 
 def register_callbacks(app):
     #CALLBACKS
 
+    #LIVE DATA
+    @app.callback(
+        [Output('load', 'children'), Output('data_version', 'data')],
+        Input('live_interval', 'n_intervals'),
+        State('data_version', 'data'))
+    def update_live(n_intervals, version):
+        if n_intervals is None:
+            raise PreventUpdate
+        if version == config.data['all_data_version']:
+            return func.update_text(), dash.no_update
+        return func.update_text(), config.data['all_data_version']
+
     #SLIDER
     @app.callback(
         Output('slider-content', 'children'), 
-        [Input('load', 'children')])
-    def update_slider(load):
+        [Input('data_version', 'data')],
+        State('dates', 'data'))
+    def update_slider(version, dates):
         startDate = pd.to_datetime(config.config['date_start'])
         endDate = pd.to_datetime(config.config['date_end'])
+        value = [func.unixTimeMillis(config.config['date_start']), func.unixTimeMillis(config.config['date_end'])]
+        if dash.callback_context.triggered[0]['prop_id'] == 'data_version.data': # new live data: keep the selected dates
+            value = dates
         content = []
         content.append(
             html.Div(dcc.RangeSlider(
@@ -32,7 +53,7 @@ def register_callbacks(app):
                 max=func.unixTimeMillis(endDate),
                 count=1,
                 step=60000,
-                value=[func.unixTimeMillis(config.config['date_start']), func.unixTimeMillis(config.config['date_end'])],
+                value=value,
                 marks=func.getMarks(config.config['date_start'], config.config['date_end'], 8),
                 className='px-5'),
         id='loading'))
@@ -102,19 +123,23 @@ def register_callbacks(app):
 
     #CALC/STORE RESAMPLER VAL
     @app.callback(
-        [Output('hi_res', 'data'), Output('resampler', 'data'), Output('resample_label', 'children'),
-        Output('resample_div', 'style')],
+        [Output('hi_res', 'data'), Output('resampler', 'data'), Output('downsampler', 'data'),
+        Output('resample_label', 'children'), Output('resample_div', 'style')],
         [Input('resample_radio', 'value'), Input('resample_set', 'value'), Input('dates', 'data')])
     def calcResampling(resolution, set, dates):
         hi_res = func.calcHiRes(dates)
         resampler = func.calcResampler(resolution, set, hi_res)
+        downsampler = func.calcDownsampler(resolution)
         if resolution == 'SET':
             style = {'display': 'block'}
         else:
             style = {'display': 'none'}
-        alert = func.resampleAlert(resampler)
+        if downsampler > 0:
+            alert = func.downsampleAlert(downsampler)
+        else:
+            alert = func.resampleAlert(resampler)
 
-        return hi_res, resampler, alert, style
+        return hi_res, resampler, downsampler, alert, style
 
 
     #PLOT SET CHOSEN - SET PLOTS & TRACES
@@ -159,10 +184,10 @@ def register_callbacks(app):
             if plot_set != -1:
                 new_plots = func.getPlots(plot_set)
                 new_traces = {}
-                for plot in config.figs['dcc_plot_figs']:
-                    if plot.id in config.config['plot_set_plots'][plot_set].keys():
-                        new_traces[plot.id] = config.config['plot_set_plots'][plot_set][plot.id]
-                        new_traces[plot.id].sort()
+                for plot_id in config.config['dcc_plot_codes']:
+                    if plot_id in config.config['plot_set_plots'][plot_set].keys():
+                        new_traces[plot_id] = config.config['plot_set_plots'][plot_set][plot_id]
+                        new_traces[plot_id].sort()
             else:
                 new_plots = plots
                 new_traces = traces
@@ -199,18 +224,18 @@ def register_callbacks(app):
         plot_content_card = dbc.Row(dbc.Col(dbc.Card(plot_content)))
 
         card_contents = [dbc.CardHeader("Select traces:", className="card-title",)]
-        for plot in config.figs['dcc_plot_figs']:
-            if plot.id in new_plots:
-                plot_name = re.sub('<.*?>', ' ', plot.figure.layout.yaxis.title.text)
+        for plot_id in config.config['dcc_plot_codes']:
+            if plot_id in new_plots:
+                plot_name = config.config['dcc_plot_names'][plot_id]
                 trace_content = [dbc.CardHeader(plot_name, className="card-title",)]
                 trace_content.append(html.Div(
                     dbc.Checklist(
                         id={
                             'type': 'trace_check',
-                            'index': plot.id + '_traces',
+                            'index': plot_id + '_traces',
                         },
-                        options=[{'label':re.sub('<.*?>', '', trace), 'value':trace} for trace in config.config['dcc_trace_names'][plot.id]],
-                        value=new_traces[plot.id],
+                        options=[{'label':re.sub('<.*?>', '', trace), 'value':trace} for trace in config.config['dcc_trace_names'][plot_id]],
+                        value=new_traces[plot_id],
                         inline=True,
                         input_checked_style={
                             "backgroundColor": "#fa7268",
@@ -237,153 +262,93 @@ def register_callbacks(app):
 
         return new_plots, plot_content_card, new_traces, trace_content_card, plot_set, plot_set_str, is_open
     
-    #SUBMIT CHART
-    @app.callback([Output('chart-content', 'children'), Output('export_msg', 'children')],
-                [Input('submit_flag', 'data'), Input('export_flag', 'data')],
-                [State('dates','data'), State('resampler', 'data'),
-                State('plots_store', 'data'), State('traces_store', 'data'), State('plot_set_store', 'data'),
-                State('height_set', 'value'), State('font_set', 'value'),
-                State('chart-content', 'children'), State('export_msg', 'children'), 
-                State('html_on', 'value'), State('csv_on', 'value'), State('pdf_on', 'value'), State('png_on', 'value'),
-                State('pdf_grp', 'children'), State('png_grp', 'children')])
-    def create_content(submit, export, dates_selected, resample, plots, traces, plot_set, height, font, chart_content, export_msg,
-                        html_on, csv_on, pdf_on, png_on, pdf_grp, png_grp):
+    #SUBMIT CHART JOB
+    @app.callback([Output('chart-content', 'children'), Output('submit_job', 'data'),
+                Output('submit_progress', 'value'), Output('submit_interval', 'disabled')],
+                [Input('submit_val', 'n_clicks'), Input('submit_interval', 'n_intervals'), Input('cancel_jobs', 'n_clicks')],
+                [State('session_id', 'data'), State('submit_job', 'data'),
+                State('dates','data'), State('resampler', 'data'), State('downsampler', 'data'),
+                State('plots_store', 'data'), State('traces_store', 'data'),
+                State('height_set', 'value'), State('font_set', 'value')])
+    def create_content(submit, n_intervals, cancel, session, job_id, dates_selected, resample, downsample, plots, traces, height, font):
         ctx = dash.callback_context
         ctx_input = ctx.triggered[0]['prop_id'].split('.')[0]
 
         if ctx.triggered[0]['value'] is None:
             raise PreventUpdate
 
-        if ctx_input == "submit_flag":
-            if not submit and not export:
-                raise PreventUpdate
-        if ctx_input == "export_flag":
-            if not export:
-                raise PreventUpdate
-        
-        chart_data = func.create_chart_data(dates_selected, resample, traces)
-        if export:
-            export_progress = 0
-            export_denom = (len([csv_on + html_on + pdf_on + png_on]))
-            export_alert = dbc.Alert([html.I(className="bi bi-check-circle-fill me-2"), "Export complete",],
-                color="success",
-                className="d-flex align-items-center mb-0 py-0")
-            
-            start = func.unixToDatetime(dates_selected[0]).strftime("%Y%m%d")
-            end = func.unixToDatetime(dates_selected[1]).strftime("%Y%m%d")
-            export_name = start + "-" + end + "_"
-            if resample > 0:
-                export_name += str(resample) + "Min_"
-            if plot_set > 0:
-                export_name += "PS" + str(plot_set)
-            else:
-                export_name += "P" + str(len(plots))
-            if csv_on:
-                filename = export_name + '_data.csv'
-                chart_data_to_export = chart_data.set_index('DateTime')
-                chart_data_to_export.to_csv(config.io_dir / 'Output' / filename)
-                export_progress += 1
-                config.fsc_e.set("export_progress", str(export_progress / export_denom))  # update progress
-                if not any([submit,html_on,pdf_on,png_on]):
-                    return dash.no_update, export_alert
-        
-        if submit or all([export,any([html_on,pdf_on,png_on])]):
-            if submit:
-                progress_pc = 1 / (len(plots.keys()) + 1)
-                config.fsc.set("submit_progress", str(progress_pc))  # update progress
-            sorted_keys = sorted(sorted(plots.keys()), key=len)
-            plots = dict(sorted(plots.items(), key=lambda pair: sorted_keys.index(pair[0])))
-            content = func.create_chart_content(chart_data, dates_selected, plots, traces, height, font)
-            if submit:
-                load_card = html.Div(id='loading', children=content)
-            if not all([export,any([html_on,pdf_on,png_on])]):
-                return load_card, dash.no_update
-            else:
-                if html_on:
-                    offline_chart = func.createOfflineCharts(content, plots, height, export_progress, export_denom)
-                    func.exportHTML(offline_chart, dates_selected, resample, export_name)
-                    config.fsc_e.set("export_progress", str(export_progress / export_denom))  # update progress
-                if pdf_on:
-                    for row in range(0,len(pdf_grp)):
-                        for prop in pdf_grp[row]['props']['children']:
-                            if prop['type'] == 'Input':
-                                if prop['props']['id'] == "pdf_width":
-                                    pdf_width = prop['props']['value']
-                                if prop['props']['id'] == "pdf_height":
-                                    pdf_height = prop['props']['value']
-                    func.exportImage(export_progress, export_denom, export_name, content, plots, "pdf", pdf_width, pdf_height)
-                if png_on:
-                    for row in range(0,len(png_grp)):
-                        for prop in png_grp[row]['props']['children']:
-                            if prop['type'] == 'Input':
-                                if prop['props']['id'] == "png_width":
-                                    png_width = prop['props']['value']
-                                if prop['props']['id'] == "png_height":
-                                    png_height = prop['props']['value']
-                                if prop['props']['id'] == "png_dpi":
-                                    png_dpi = prop['props']['value']
-                    func.exportImage(export_progress, export_denom, export_name, content, plots, "png", png_width, png_height, png_dpi)
-                config.fsc_e.set("export_progress", str(1))  # update progress
-                if submit:
-                    return load_card, export_alert
-                else:
-                    return dash.no_update, export_alert
-        else:
-            time.sleep(2)
+        if ctx_input == 'submit_val':
+            job_id = Jobs.submit('submit', session, func.submit_charts, dates_selected, resample, downsample, plots, traces, height, font)
+            return dash.no_update, job_id, 0, False
+        if ctx_input == 'cancel_jobs':
+            Jobs.cancel(job_id)
             raise PreventUpdate
 
-    #SUBMIT PROGRESS
-    @app.callback(
-        [Output('submit_val', 'n_clicks'), Output('submit_flag', 'data'),
-        Output("submit_progress", "value"), Output('submit_interval', 'disabled'),
-        Output('export_submit', 'n_clicks'), Output('export_flag', 'data'),
-        Output("export_progress", "value"), Output('export_interval', 'disabled')],
-        [Input('submit_val', 'n_clicks'), Input('export_submit', 'n_clicks')],
-        [Trigger("submit_interval", "n_intervals"), Trigger("export_interval", "n_intervals")],
-        State('csv_on', 'value'), State('html_on', 'value'), State('pdf_on', 'value'), State('png_on', 'value'))
-    def update_progress(submit, export, csv_on, html_on, pdf_on, png_on):
+        job = Jobs.get(job_id)
+        if job is None:
+            return dash.no_update, None, 0, True
+        if job.status == 'done':
+            return html.Div(id='loading', children=job.result), dash.no_update, 100, True
+        if job.status == 'failed':
+            return jobAlert("Charts failed: " + job.error, "danger"), dash.no_update, 0, True
+        if job.status == 'cancelled':
+            return dash.no_update, dash.no_update, 0, True
+        return dash.no_update, dash.no_update, int(job.progress * 100), dash.no_update
+
+    #EXPORT JOB
+    @app.callback([Output('export_msg', 'children'), Output('export_job', 'data'),
+                Output('export_progress', 'value'), Output('export_interval', 'disabled')],
+                [Input('export_submit', 'n_clicks'), Input('export_interval', 'n_intervals'), Input('cancel_jobs', 'n_clicks')],
+                [State('session_id', 'data'), State('export_job', 'data'),
+                State('dates','data'), State('resampler', 'data'), State('downsampler', 'data'),
+                State('plots_store', 'data'), State('traces_store', 'data'), State('plot_set_store', 'data'),
+                State('height_set', 'value'), State('font_set', 'value'),
+                State('html_on', 'value'), State('csv_on', 'value'), State('pdf_on', 'value'), State('png_on', 'value'),
+                State('pdf_grp', 'children'), State('png_grp', 'children')])
+    def export_content(export, n_intervals, cancel, session, job_id, dates_selected, resample, downsample, plots, traces, plot_set, height, font,
+                        html_on, csv_on, pdf_on, png_on, pdf_grp, png_grp):
         ctx = dash.callback_context
         ctx_input = ctx.triggered[0]['prop_id'].split('.')[0]
+
         if ctx.triggered[0]['value'] is None:
             raise PreventUpdate
 
-        if ctx_input == 'submit_interval' or ctx_input == 'submit_val':
-            if submit > 0:
-                config.fsc.set("submit_progress", str(0))  # clear progress
-                return 0, True, 0, False, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-            s_value = config.fsc.get("submit_progress")  # get progress
-            if s_value is None:
-                raise PreventUpdate
-            s_progress = int(float(s_value) * 100)
-            if s_progress is 100:
-                if submit:
-                    return dash.no_update, False, 100, True, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-                else:
-                    return dash.no_update, dash.no_update, 100, True, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-            return dash.no_update, dash.no_update, s_progress, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-        elif ctx_input == 'export_interval' or ctx_input == 'export_submit':
-            if export > 0:
-                config.fsc_e.set("export_progress", str(0))  # clear progress
-                if any([html_on, pdf_on, png_on]):
-                    config.fsc.set("submit_progress", str(0))  # clear progress
-                    return 0, False, 0, False, 0, True, 0, False
-                else:
-                    return 0, False, 0, True, 0, True, 0, False
-            if any([html_on, pdf_on, png_on]):
-                s_value = config.fsc.get("submit_progress")  # get progress
-                if s_value is None:
-                    raise PreventUpdate
-                s_progress = int(float(s_value) * 100)
-                if s_progress is not 100:
-                    return dash.no_update, dash.no_update, s_progress, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-            e_value = config.fsc_e.get("export_progress")  # get progress
-            if e_value is None:
-                raise PreventUpdate
-            e_progress = int(float(e_value) * 100)
-            if e_progress is 100:
-                return dash.no_update, dash.no_update, 100, dash.no_update, dash.no_update, False, 100, True
-            else:
-                return dash.no_update, dash.no_update, 100, dash.no_update, dash.no_update, dash.no_update, e_progress, dash.no_update
+        if ctx_input == 'export_submit':
+            pdf_size = {}
+            for row in range(0,len(pdf_grp)):
+                for prop in pdf_grp[row]['props']['children']:
+                    if prop['type'] == 'Input':
+                        if prop['props']['id'] == "pdf_width":
+                            pdf_size['width'] = prop['props']['value']
+                        if prop['props']['id'] == "pdf_height":
+                            pdf_size['height'] = prop['props']['value']
+            png_size = {}
+            for row in range(0,len(png_grp)):
+                for prop in png_grp[row]['props']['children']:
+                    if prop['type'] == 'Input':
+                        if prop['props']['id'] == "png_width":
+                            png_size['width'] = prop['props']['value']
+                        if prop['props']['id'] == "png_height":
+                            png_size['height'] = prop['props']['value']
+                        if prop['props']['id'] == "png_dpi":
+                            png_size['dpi'] = prop['props']['value']
+            job_id = Jobs.submit('export', session, func.export_charts, dates_selected, resample, downsample, plots, traces, plot_set, height, font,
+                                 csv_on, html_on, pdf_on, png_on, pdf_size, png_size)
+            return "", job_id, 0, False
+        if ctx_input == 'cancel_jobs':
+            Jobs.cancel(job_id)
+            raise PreventUpdate
+
+        job = Jobs.get(job_id)
+        if job is None:
+            return dash.no_update, None, 0, True
+        if job.status == 'done':
+            return jobAlert("Export complete", "success", "bi-check-circle-fill"), dash.no_update, 100, True
+        if job.status == 'failed':
+            return jobAlert("Export failed: " + job.error, "danger"), dash.no_update, 0, True
+        if job.status == 'cancelled':
+            return jobAlert("Export cancelled", "secondary"), dash.no_update, 0, True
+        return dash.no_update, dash.no_update, int(job.progress * 100), dash.no_update
             
     #PDF
     @app.callback(Output('pdf_grp', 'children'),
@@ -0,0 +1,62 @@
+# Import packages
+import sys
+import threading
+from collections import OrderedDict
+
+import Scripts.config as config
+
+# Least recently used cache of chart data and figure content for the chart callbacks
+# Entries are keyed on the chart request and the all_data version so reloading all_data
+# (DataAccess.setAllData) invalidates them. The total size is bounded by config.chart_cache_mb.
+
+class ChartCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes: # evict least recently used
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.bytes}
+
+cache = ChartCache(config.chart_cache_mb * 2**20)
+
+def dataKey(dates_selected, resample, downsample, traces):
+    return ('data', config.data['all_data_version'], tuple(dates_selected), resample, downsample,
+            tuple((plot_id, tuple(trace_list)) for plot_id, trace_list in traces.items()))
+
+def contentKey(data_key, plots, height, font):
+    return ('content', data_key, tuple(plots.items()), height, font)
+
+def frameBytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def textBytes(text):
+    return sys.getsizeof(text)
@@ -0,0 +1,83 @@
+# Import packages
+import numpy as np
+import pandas as pd
+
+import Scripts.config as config
+
+# Compact in-memory representation of all_data (--compact)
+# Parameters with dtype float32 in the parameters (or parameters_ave) sheet are held as float32,
+# along with their _err columns, and bar (state) parameters as categoricals, i.e. small integer codes
+# of their few distinct values. Slices of all_data are converted back to float64 (floatFrame) before
+# they are used for charts and exports.
+
+MAX_STATES = 127 # most distinct values of a state column held as int8 codes
+
+def declaredTypes():
+    # dict of parameter: 'float32' or 'state' from the parameters sheets
+    types = {}
+    for sheet, par_col in [('parameters', 'parameter'), ('parameters_ave', 'parameter_ave')]:
+        info = config.config['info'].get(sheet)
+        if info is None:
+            continue
+        if 'dtype' in info.columns:
+            for par, dtype in zip(info[par_col], info['dtype']):
+                if not pd.isna(dtype) and str(dtype).strip() == 'float32':
+                    types[par] = 'float32'
+        for par in info[info['bar'] == True][par_col]:
+            types[par] = 'state'
+    return types
+
+def stateColumn(values):
+    # Categorical of a column of integer states, or None if it has fractions or too many states
+    finite = values[~np.isnan(values)]
+    if not np.array_equal(finite, np.round(finite)):
+        return None
+    states = np.unique(finite)
+    if len(states) > MAX_STATES:
+        return None
+    return pd.Categorical(values, categories=states)
+
+def compactFrame(df):
+    # all_data with the declared columns held as float32 or state codes
+    types = declaredTypes()
+    columns = {}
+    for col in df.columns[1:]:
+        par = col[:-len("_err")] if col.endswith("_err") else col
+        if df[col].dtype != np.float64 or par not in types:
+            continue
+        if types[par] == 'state' and col == par:
+            states = stateColumn(df[col].to_numpy())
+            if states is not None:
+                columns[col] = states
+                continue
+        if types[par] == 'float32':
+            columns[col] = df[col].astype(np.float32)
+    if len(columns) == 0:
+        return df
+    compact = df.copy(deep=False)
+    for col, values in columns.items():
+        compact[col] = values
+    return compact
+
+def memoryReport(before, after):
+    # Print the memory of each compacted column before and after, and of the whole dataframe
+    before_bytes = before.memory_usage(index=False, deep=True)
+    after_bytes = after.memory_usage(index=False, deep=True)
+    changed = [col for col in after.columns if after[col].dtype != before[col].dtype]
+    print("Compact all_data: " + str(len(changed)) + " of " + str(len(after.columns) - 1) + " columns compacted, "
+          + str(round(before_bytes.sum() / 2**20, 1)) + " MB -> " + str(round(after_bytes.sum() / 2**20, 1)) + " MB")
+    for col in changed:
+        print("  " + col + ": " + str(before[col].dtype) + " " + str(round(before_bytes[col] / 2**20, 2)) + " MB -> "
+              + str(after[col].dtype) + " " + str(round(after_bytes[col] / 2**20, 2)) + " MB")
+
+def compactAllData(df):
+    compact = compactFrame(df)
+    memoryReport(df, compact)
+    return compact
+
+def floatFrame(df):
+    # df with any compact columns as float64
+    compact = [col for col, dtype in df.dtypes.items() if col != 'DateTime' and dtype != np.float64]
+    if len(compact) == 0:
+        return df
+    return df.astype({col: np.float64 for col in compact})
@@ -0,0 +1,67 @@
+# Import packages
+import os
+import json
+import pickle
+import shutil
+import plotly
+
+import Scripts.config as config
+
+# Storage of the chart config made by CreateCharts for the app
+# Output/app_config holds config.pkl (config.config, without figures) and one
+# JSON figure template (plain dict figure without data, with its dcc.Graph style) per graph in
+# templates/. The app loads config.pkl at start up and each template the first time its plot is used.
+# Replaces the sub_config2.pbz2 pickle of every figure object.
+
+CONFIG_VERSION = 1
+
+def storeFolder():
+    return config.io_dir / "Output" / "app_config"
+
+def templatePath(graph_id, folder = None):
+    if folder is None:
+        folder = storeFolder()
+    return folder / "templates" / (graph_id + ".json")
+
+def figureTemplate(graph):
+    # Plain dict figure of a dcc.Graph of a go.Figure, with the graph's style
+    return {'data': [trace.to_plotly_json() for trace in graph.figure.data],
+            'layout': graph.figure.layout.to_plotly_json(),
+            'style': dict(graph.style)}
+
+def saveConfig(graphs):
+    # Write config.config and a template of each dcc.Graph, replacing any previous app config
+    folder = storeFolder()
+    temp_folder = folder.with_name(folder.name + "_tmp")
+    if os.path.exists(temp_folder):
+        shutil.rmtree(temp_folder)
+    (temp_folder / "templates").mkdir(parents=True)
+    for graph in graphs:
+        with open(templatePath(graph.id, temp_folder), 'w') as template_file:
+            json.dump(figureTemplate(graph), template_file, cls=plotly.utils.PlotlyJSONEncoder)
+    with open(temp_folder / "config.pkl", 'wb') as config_file:
+        pickle.dump({'version': CONFIG_VERSION, 'config': config.config}, config_file, protocol=4)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.replace(temp_folder, folder)
+
+def configExists():
+    return os.path.exists(storeFolder() / "config.pkl")
+
+def loadConfig():
+    # Set config.config from the stored app config, returning False if there is none of this version
+    if not configExists():
+        return False
+    with open(storeFolder() / "config.pkl", 'rb') as config_file:
+        stored = pickle.load(config_file)
+    if stored.get('version') != CONFIG_VERSION:
+        print("Stored app config version " + str(stored.get('version')) + " not supported - ignoring")
+        return False
+    for key in stored['config']:
+        config.config[key] = stored['config'][key]
+    config.figs['plot_templates'] = {}
+    return True
+
+def loadTemplate(graph_id):
+    with open(templatePath(graph_id), 'r') as template_file:
+        return json.load(template_file)
@@ -3,29 +3,32 @@ import os
 from tqdm.autonotebook import tqdm
 import pandas as pd
 import numpy as np
-import bz2
-import pickle
 import plotly.graph_objects as go
 from dash import dcc
 import re
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 
 import Scripts.config as config
 import Scripts.ProcessData_resampler as ProcessData
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+import Scripts.MetaIndex as MetaIndex
+import Scripts.ConfigStore as ConfigStore
 
 def getData():
-    pfile_path = config.io_dir / "Output" / 'all_data.pbz2'
-    if os.path.exists(pfile_path) and config.update:
+    if DataStore.dataExists() and config.update and not config.refresh:
         print("Importing processed data...")
-        with bz2.open(pfile_path, 'rb') as pfile:
-            config.data['all_data'] = pickle.load(pfile)
+        DataAccess.setAllData(DataStore.loadAllData())
     else:
-        if config.update:
-            print("No processed all_data.pbz2 file exists - fetching all data")
+        if config.refresh and config.update:
+            print("Fetching new data")
+        elif config.update:
+            print("No processed all_data store exists - fetching all data")
         else:
             print("Fetching all data")
         ProcessData.main()
         config.update = True
+        config.refresh = False
         getData()
 
 def plotSetParDict(df):
@@ -68,15 +71,15 @@ def getPlotsInfo():
     return(plots_info)
 
 def addTrace(par, plot_fig):
-    par_info = config.config['plot_pars'].query('parameter == "' + par + '"')
+    par_info = MetaIndex.parameterInfo(par)
 
     def addLine(plot_fig):
         legend_show = True #default on
-        if any(par_info['show_in_legend'].values == False) or any(par_info['point'].values == True) or any(par_info['bar'].values == True):
+        if par_info.show_in_legend == False or par_info.point == True or par_info.bar == True:
             legend_show = False
         trace = trace_base
         trace.update(mode = "lines",
-                    line=dict(color=par_info['colour'][0], width=2, dash=par_info['dash'][0], shape=par_info['line'][0]),
+                    line=dict(color=par_info.colour, width=2, dash=par_info.dash, shape=par_info.line),
                     connectgaps=False,
                     showlegend=legend_show)
         plot_fig.add_trace(trace)
@@ -86,36 +89,34 @@ def addTrace(par, plot_fig):
         trace = trace_base
         trace.update(#x = x_data, y = y_data,
                     mode = 'markers',
-                    marker = dict(color = par_info['fill'][0], symbol = par_info['shape'][0],
-                                line = dict(color = par_info['colour'][0],width=1)),
-                    showlegend = bool(par_info['show_in_legend'][0]))
-        if error_bars:
-            trace.update(error_y = dict(type = 'data', visible = True))#, array = y_error))
+                    marker = dict(color = par_info.fill, symbol = par_info.shape,
+                                line = dict(color = par_info.colour,width=1)),
+                    showlegend = bool(par_info.show_in_legend))
         plot_fig.add_trace(trace)
         return(plot_fig)
     
     def addRibbon(plot_fig):
         ribbon_base = go.Scatter(#x=x_data,
-                                name=par_info['parameter_lab'][0],
-                                line=dict(color=par_info['colour'][0], dash = 'dot'),
+                                name=par_info.parameter_lab,
+                                line=dict(color=par_info.colour, dash = 'dot'),
                                 connectgaps=True,
-                                legendgroup=par_info['parameter_lab'][0],
+                                legendgroup=par_info.parameter_lab,
                                 showlegend=False,
                                 hoverinfo='skip')
         trace1 = ribbon_base
         trace1.update(mode='lines', line=dict(width=0))
         plot_fig.add_trace(trace1)
         trace2 = ribbon_base
-        trace2.update(fill='tonexty', mode='none', fillcolor=par_info['fill'][0],
+        trace2.update(fill='tonexty', mode='none', fillcolor=par_info.fill,
                     line=dict(width=0.5)) #fill to trace1 y
         plot_fig.add_trace(trace2)
         return(plot_fig)
     
     def addBars(plot_fig):
-        bar_base = go.Scatter(name=par_info['parameter_lab'][0],
-                                line=dict(color=par_info['colour'][0], dash = 'dot'),
+        bar_base = go.Scatter(name=par_info.parameter_lab,
+                                line=dict(color=par_info.colour, dash = 'dot'),
                                 connectgaps=True,
-                                legendgroup=par_info['parameter_lab'][0],
+                                legendgroup=par_info.parameter_lab,
                                 showlegend=False,
                                 hoverinfo='skip')
         trace1 = bar_base
@@ -124,48 +125,34 @@ def addTrace(par, plot_fig):
         plot_fig.add_trace(trace1)
         trace2 = bar_base
         trace2.update(#x = x_data, y=par_info['bar_order'][0] - y_data.round()/2,
-                    fill='tonexty', mode='none', fillcolor=par_info['fill'][0],
+                    fill='tonexty', mode='none', fillcolor=par_info.fill,
                     line=dict(width=0.5), line_shape = "hv", showlegend=True, hoverinfo='all') #fill to trace1 y
         plot_fig.add_trace(trace2)
 
         return(plot_fig)
 
-    if len(par_info) != 0:
-        all_data_pars = [c for c in config.data['all_data'].columns[1:] if not "_err" in c]
-
-
-        x_data = deepcopy(config.data['all_data'].DateTime)
-        y_data = deepcopy(config.data['all_data'][par])
-        error_bars = False
-        if par + "_err" in all_data_pars:
-            error_bars = True
-            y_error = deepcopy(config.data['all_data'][par + "_err"])
-
-        if any(par_info['point'] ==True) or any(par_info['bar'] ==True):
-            if error_bars:
-                y_error.drop(y_error[np.isnan(y_data)].index, inplace=True)
-            x_data.drop(x_data[np.isnan(y_data)].index, inplace=True)
-            y_data.drop(y_data[np.isnan(y_data)].index, inplace=True)
-
+    if par_info is not None:
+        # Template traces only: the data (and any error bars) are added to copies of the templates
+        # by Functions.addDatatoPlot
         trace_base = go.Scatter(x=[], y=[],
-                    name=par_info['parameter_lab'][0], 
-                    legendgroup=par_info['parameter_lab'][0])
+                    name=par_info.parameter_lab, 
+                    legendgroup=par_info.parameter_lab)
 
-        if not any(pd.isna(par_info['line'].values)):
+        if not pd.isna(par_info.line):
             plot_fig = addLine(plot_fig)
 
-        if any(par_info['point'].values == True):
+        if par_info.point == True:
             plot_fig = addPoints(plot_fig)
 
-        if any(par_info['ribbon'].values == True):
+        if par_info.ribbon == True:
             plot_fig = addRibbon(plot_fig)
 
-        if any(par_info['bar'].values == True):
+        if par_info.bar == True:
             plot_fig = addBars(plot_fig)
     return(plot_fig)
 
-def modifyPlot(plot_fig, plot):
-    plot_info = getPlotsInfo().query('plot == "' + plot + '"')
+def modifyPlot(plot_fig, plot, x_range):
+    plot_info = MetaIndex.plotInfo(plot)
     plot_fig.update_layout(
         margin=dict(l=100, r=250, b=15, t=15, pad=10),
         template="simple_white",
@@ -174,28 +161,42 @@ def modifyPlot(plot_fig, plot):
             family="Arial",
             color="black"
         ))
-    plot_fig.update_yaxes(title_text=plot_info['ylab'][plot], mirror=True)
+    plot_fig.update_yaxes(title_text=plot_info.ylab, mirror=True)
     plot_fig.update_xaxes(showgrid=True, showticklabels=False, ticks="",
         showline=True, mirror=True,
-        range=[min(config.data['all_data'].DateTime), max(config.data['all_data'].DateTime)])
+        range=list(x_range))
         #fixedrange=True) #prevent x zoom
     return(plot_fig)
 
-def createPlotFig(plot):    
-    plot_pars = config.config['plot_pars'].query('plot == "' + plot + '"').parameter.unique().tolist()
+def createPlotFig(plot, x_range):
+    # Figure base of plot from the plot_pars metadata only, with x axis range x_range
+    plot_pars = MetaIndex.plotInfo(plot).parCodes()
     plot_fig = go.Figure()
     #Add traces
     for par in plot_pars:
         plot_fig = addTrace(par, plot_fig)
     #Modify plot layout
-    plot_fig = modifyPlot(plot_fig, plot)
+    plot_fig = modifyPlot(plot_fig, plot, x_range)
     return(plot_fig)
 
+def initPlotWorker(plot_pars, plots_info):
+    config.config['plot_pars'] = plot_pars
+    config.config['info']['plots'] = plots_info
+
 def createPlotFigs():
     plot_figs = {}
-    # For each plot
-    for plot in tqdm(getPlotsInfo().index.to_list(), desc = "Creating plot figure bases"):
-        plot_figs[plot] =  createPlotFig(plot)
+    plots = getPlotsInfo().index.to_list()
+    x_range = DataAccess.dateExtent() # the only use of all_data
+    if config.workers > 1 and len(plots) > 1:
+        with ProcessPoolExecutor(max_workers=min(config.workers, len(plots)), initializer=initPlotWorker,
+                                 initargs=(config.config['plot_pars'], config.config['info']['plots'])) as pool:
+            futures = [pool.submit(createPlotFig, plot, x_range) for plot in plots]
+            for plot, future in zip(plots, tqdm(futures, desc = "Creating plot figure bases")):
+                plot_figs[plot] = future.result()
+    else:
+        # For each plot
+        for plot in tqdm(plots, desc = "Creating plot figure bases"):
+            plot_figs[plot] = createPlotFig(plot, x_range)
     return(plot_figs)
 
 def createDashCharts():
@@ -211,7 +212,7 @@ def createDashCharts():
                                             style={'width': '98vw', 'height': ''+ height + ''}))
         config.config['dcc_plot_codes']['graph' + str(p)] = plot
         config.config['dcc_plot_names']['graph' + str(p)] = re.sub('<.*?>', ' ', config.config['info']['plots']['ylab'][plot])
-        config.config['dcc_trace_names']['graph' + str(p)] = list(config.config['plot_pars'].query('plot == "' + plot + '"')['parameter_lab'].unique())
+        config.config['dcc_trace_names']['graph' + str(p)] = list(MetaIndex.plotInfo(plot).labels)
         p = p + 1
     return(dcc_chart_fig)
 
@@ -226,10 +227,6 @@ def modPlotSetPlots(dict):
                     new_dict[plot_set].pop(graph)
     return new_dict
 
-def saveObject(object_to_save, filepath):
-    with bz2.BZ2File(filepath, 'wb') as f:
-        pickle.dump(object_to_save, f)
-
 def main():
     ProcessData.processArguments()
     ProcessData.openinfoFile()
@@ -238,6 +235,7 @@ def main():
     plotParDicts()
     config.figs['plot_figs']  = createPlotFigs()
     config.figs['dcc_plot_figs'] = createDashCharts()
+    config.figs['plot_templates'] = {}
     config.config['plot_set_plots'] = modPlotSetPlots(config.config['plot_set_plots'])
 
         #pbar.set_description("Exporting chart %s" % plot_set)
@@ -250,11 +248,10 @@ def main():
         #    exportImage(chart, 'pdf')
         
 
-    # # saveObject(config.config, (config.io_dir / 'Temp' / 'config.pbz2'))
-    export_config = [config.config, config.figs]
-    
-    print("Exporting sub_config2.pbz2 to Output")
-    saveObject(export_config, (config.io_dir / 'Output' / 'sub_config2.pbz2'))
+    print("Exporting app_config to Output")
+    ConfigStore.saveConfig(config.figs['dcc_plot_figs'])
+    config.figs['plot_figs'] = {} # figures are loaded from the templates when used
+    config.figs['dcc_plot_figs'] = []
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
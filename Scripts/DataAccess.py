@@ -0,0 +1,186 @@
+# Import packages
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+import Scripts.config as config
+import Scripts.DataStore as DataStore
+import Scripts.ChartCache as ChartCache
+import Scripts.Compact as Compact
+
+# Time indexed access to the master all_data dataframe used by the charts
+# all_data is sorted by DateTime, so alongside it an int64 epoch (ns) array of the DateTime column
+# is kept and date ranges are found by binary search instead of query() scans of the dataframe.
+# Reads hold the read side of `lock`, so live ingest (LiveIngest) can swap in a new all_data under
+# the write side without a read seeing the new dataframe with the old epoch index.
+
+class RWLock:
+    # Any number of readers or one writer. A waiting writer stops new reads starting, so steady chart
+    # reads cannot hold off live ingest, but a thread already reading (or writing) can nest reads
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = None # thread id of the writer
+        self.writers_waiting = 0
+        self.depth = threading.local() # reads held by each thread
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self.depth, 'reads', 0)
+        nested = depth > 0 or self.writer == threading.get_ident()
+        if not nested:
+            with self.condition:
+                while self.writer is not None or self.writers_waiting > 0:
+                    self.condition.wait()
+                self.readers += 1
+        self.depth.reads = depth + 1
+        try:
+            yield
+        finally:
+            self.depth.reads = depth
+            if not nested:
+                with self.condition:
+                    self.readers -= 1
+                    self.condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self.condition:
+            self.writers_waiting += 1
+            try:
+                while self.writer is not None or self.readers > 0:
+                    self.condition.wait()
+            finally:
+                self.writers_waiting -= 1
+            self.writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = None
+                self.condition.notify_all()
+
+lock = RWLock()
+
+def setAllData(df, handle = None):
+    # Set all_data (compacted if config.compact) and rebuild its epoch index
+    # handle: SharedData.Handle of the shared file df was mapped from (already compacted)
+    if config.compact and df is not None and handle is None:
+        df = Compact.compactAllData(df)
+    config.data['all_data'] = df
+    config.data['all_data_handle'] = handle
+    indexAllData()
+
+def indexAllData():
+    # Epoch index of the all_data set, under a new version
+    df = config.data['all_data']
+    if df is None:
+        config.data['all_data_epoch'] = None
+    else:
+        config.data['all_data_epoch'] = pd.DatetimeIndex(df['DateTime']).asi8
+    config.data['all_data_version'] += 1
+    ChartCache.cache.clear()
+
+def epochIndex():
+    if config.data['all_data_epoch'] is None or len(config.data['all_data_epoch']) != len(config.data['all_data']):
+        config.data['all_data_handle'] = None # all_data replaced, so not the shared file
+        indexAllData()
+    return config.data['all_data_epoch']
+
+def snapshot():
+    # all_data and its shared file handle, for reads made after the lock is released
+    return config.data['all_data'], config.data['all_data_handle']
+
+def rows(first, last, columns = None, source = None):
+    # Rows first to last (columns of) all_data (or of a snapshot), as views of the shared file if it is mapped
+    df, handle = snapshot() if source is None else source
+    if handle is not None:
+        return handle.rows(first, last, columns)
+    df = df.iloc[first:last]
+    if columns is not None:
+        df = df[columns]
+    return df
+
+def toEpoch(date):
+    return DataStore.utcTimestamp(date).value
+
+def rangeBounds(start, end):
+    # Row positions of all_data with start < DateTime < end
+    epoch = epochIndex()
+    first = np.searchsorted(epoch, toEpoch(start), side='right')
+    last = np.searchsorted(epoch, toEpoch(end), side='left')
+    return first, max(first, last)
+
+def rangeCount(start, end):
+    with lock.reading():
+        first, last = rangeBounds(start, end)
+    return last - first
+
+def rangeSlice(start, end, columns = None):
+    # Rows of all_data with start < DateTime < end, projected to columns after slicing
+    with lock.reading():
+        first, last = rangeBounds(start, end)
+        df = rows(first, last, columns)
+    return Compact.floatFrame(df)
+
+def rangeChunks(start, end, columns, chunk_rows):
+    # Rows of all_data with start < DateTime < end, projected to columns, in DateTime ordered chunks of chunk_rows
+    with lock.reading():
+        first, last = rangeBounds(start, end)
+        source = snapshot() # chunks all come from the all_data of the first
+    for chunk_start in range(first, last, chunk_rows):
+        yield Compact.floatFrame(rows(chunk_start, min(chunk_start + chunk_rows, last), columns, source))
+
+def dateExtent():
+    # First and last DateTime of all_data
+    datetimes = config.data['all_data']['DateTime']
+    return datetimes.iloc[0], datetimes.iloc[-1]
+
+def minMaxMask(epoch, values, buckets):
+    # Points of each column (of values) kept by the shape preserving downsample: the minimum and maximum
+    # of the column in each of `buckets` equal time buckets, the first and last rows and, in buckets
+    # where the column has a gap (missing values between two values), one missing row to keep the gap
+    n, k = values.shape
+    span = epoch[-1] - epoch[0] + 1
+    bucket = np.minimum(((epoch - epoch[0]) / span * buckets).astype(np.int64), buckets - 1)
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    sizes = np.diff(np.append(starts, n))
+    rows = np.arange(n)[:, np.newaxis]
+    valid = ~np.isnan(values)
+    after = np.maximum.accumulate(valid[::-1], axis=0)[::-1] # a value in this or a later row
+    gaps = ~valid[1:] & valid[:-1] & after[1:]
+    gaps = np.concatenate((np.zeros((1, k), dtype=bool), gaps))
+    with np.errstate(invalid='ignore'):
+        mins = np.repeat(np.fmin.reduceat(values, starts, axis=0), sizes, axis=0)
+        maxs = np.repeat(np.fmax.reduceat(values, starts, axis=0), sizes, axis=0)
+    mask = np.zeros((n + 1, k), dtype=bool) # row n for buckets without a selected row
+    for selected in [np.where(values == mins, rows, n), np.where(values == maxs, rows, n), np.where(gaps, rows, n)]:
+        mask[np.minimum.reduceat(selected, starts, axis=0), np.arange(k)] = True
+    mask[[0, n - 1]] = True
+    return mask[:n]
+
+def minMaxRows(epoch, values, buckets):
+    # Rows holding a point of any column kept by minMaxMask
+    return np.flatnonzero(minMaxMask(epoch, values, buckets).any(axis=1))
+
+def decimate(x, arrays, budget):
+    # Rows of a trace kept within the point budget, keeping the peaks and troughs (and gaps) of y
+    if budget == 0 or len(x) <= budget:
+        return x, arrays
+    values = np.asarray(arrays['y'], dtype=float)[:, np.newaxis]
+    rows = minMaxRows(pd.DatetimeIndex(x).asi8, values, max(1, budget // 2))
+    return x[rows], {key: (array if array is None else np.asarray(array)[rows]) for key, array in arrays.items()}
+
+def rangeDownsample(start, end, columns, value_columns, budget):
+    # Rows of all_data with start < DateTime < end holding the points minMaxMask keeps of any value column
+    # (about `budget` per column). The rows kept for the other columns are the raw values too, so each
+    # trace is reduced to its own points again by decimate (Functions.addDatatoPlot)
+    with lock.reading():
+        first, last = rangeBounds(start, end)
+        df = rows(first, last, list(dict.fromkeys(list(columns) + list(value_columns))))
+        epoch = epochIndex()[first:last]
+    if last - first > budget and len(value_columns) > 0:
+        values = df[value_columns].to_numpy(dtype=float)
+        df = df.iloc[minMaxRows(epoch, values, max(1, budget // 2))]
+    return Compact.floatFrame(df[columns])
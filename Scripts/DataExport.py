@@ -0,0 +1,72 @@
+# Import packages
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import Scripts.config as config
+
+# Streaming export of DateTime ordered dataframe chunks
+# Each chunk is written to the file as soon as it is produced (as csv, gzip or zstd compressed csv, or
+# parquet), so an export only holds one chunk in memory however long the date range is.
+
+export_formats = {'csv': '.csv', 'csv.gz': '.csv.gz', 'csv.zst': '.csv.zst', 'parquet': '.parquet'}
+csv_compression = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+def exportPath(filepath, export_format):
+    # filepath (without extension) with the extension of the export format
+    return filepath.with_name(filepath.name + export_formats[export_format])
+
+class ChunkWriter:
+    # Write dataframe chunks with the same columns to one csv (optionally compressed) or parquet file
+    def __init__(self, filepath, export_format):
+        if export_format not in export_formats:
+            raise ValueError("Unknown export format: " + str(export_format))
+        self.filepath = filepath
+        self.export_format = export_format
+        self.stream = None
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.export_format == 'parquet':
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = pq.ParquetWriter(str(self.filepath), self.schema, compression=config.store_compression)
+            self.writer.write_table(table)
+        else:
+            header = self.stream is None
+            if header:
+                self.stream = pa.output_stream(str(self.filepath), compression=csv_compression[self.export_format])
+            self.stream.write(df.to_csv(header=header, index=False).encode('utf-8'))
+        self.rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.stream is not None:
+            self.stream.close()
+
+def writeChunks(chunks, filepath, export_format = None, total_rows = None, progress = None, columns = None):
+    # Write chunks to filepath (without extension) in export_format, calling progress(fraction of total_rows written)
+    # after each chunk, and return the path written
+    if export_format is None:
+        export_format = config.data_export_format
+    filepath = exportPath(filepath, export_format)
+    writer = ChunkWriter(filepath, export_format)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            if progress is not None and total_rows:
+                progress(writer.rows / total_rows)
+        if writer.rows == 0 and columns is not None: # header only
+            writer.write(pd.DataFrame(columns=columns))
+    except BaseException:
+        writer.close()
+        if os.path.exists(filepath): # no partial exports
+            os.remove(filepath)
+        raise
+    writer.close()
+    return filepath
@@ -0,0 +1,285 @@
+# Import packages
+import os
+import json
+import bz2
+import pickle
+import shutil
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pytz import timezone
+
+import Scripts.config as config
+
+# Storage for the master all_data dataframe
+# all_data is stored as one file per calendar month (time partitions) in Output/all_data
+# with a meta.json file listing the partitions, columns and date extents.
+# The legacy all_data.pbz2 bz2-pickle is still read if no partitioned store exists.
+
+STORE_VERSION = 1
+store_formats = {'parquet': '.parquet', 'feather': '.feather', 'pbz2': '.pbz2'}
+
+def storeFolder():
+    return config.io_dir / "Output" / "all_data"
+
+def legacyFile():
+    return config.io_dir / "Output" / "all_data.pbz2"
+
+def readMeta(folder = None):
+    if folder is None:
+        folder = storeFolder()
+    meta_path = folder / "meta.json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r') as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('version') != STORE_VERSION:
+        print("Stored all_data version " + str(meta.get('version')) + " not supported - ignoring store")
+        return None
+    return meta
+
+def dataExists():
+    return readMeta() is not None or os.path.exists(legacyFile())
+
+def partitionKeys(datetimes):
+    # Calendar month partition key (e.g. 202301) for each DateTime
+    return (datetimes.dt.year * 100 + datetimes.dt.month).to_numpy()
+
+def writeFrame(df, filepath, store_format):
+    if store_format == 'parquet':
+        df.to_parquet(filepath, engine='pyarrow', compression=config.store_compression, index=False)
+    elif store_format == 'feather':
+        df.reset_index(drop=True).to_feather(filepath, compression='lz4')
+    elif store_format == 'pbz2':
+        with bz2.BZ2File(filepath, 'wb') as f:
+            pickle.dump(df, f, protocol=4)
+    else:
+        raise ValueError("Unknown store format: " + str(store_format))
+
+def readFrame(filepath, store_format, columns = None):
+    if store_format == 'parquet':
+        df = pd.read_parquet(filepath, engine='pyarrow', columns=columns)
+    elif store_format == 'feather':
+        df = pd.read_feather(filepath, columns=columns)
+    elif store_format == 'pbz2':
+        with bz2.open(filepath, 'rb') as pfile:
+            df = pickle.load(pfile)
+        if columns is not None:
+            df = df[columns]
+    else:
+        raise ValueError("Unknown store format: " + str(store_format))
+    return df
+
+class PartitionWriter:
+    # Write a DateTime ordered stream of dataframe chunks into monthly partition files
+    def __init__(self, folder, store_format, columns = None):
+        self.folder = folder
+        self.store_format = store_format
+        self.columns = columns
+        self.filled = set()
+        self.partitions = {}
+        self.key = None
+        self.parts = []
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        if len(df) == 0:
+            return
+        if self.columns is None:
+            self.columns = df.columns.to_list()
+        elif df.columns.to_list() != self.columns:
+            df = df.reindex(columns=self.columns)
+        self.filled.update(df.columns[df.notna().any().to_numpy()])
+        keys = partitionKeys(df['DateTime'])
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1, [len(df)]))
+        for i in range(len(bounds) - 1):
+            part = df.iloc[bounds[i]:bounds[i + 1]]
+            key = str(keys[bounds[i]])
+            if key != self.key:
+                self.closePartition()
+                self.key = key
+                self.partitions[key] = {'file': "all_data_" + key[:4] + "-" + key[4:] + store_formats[self.store_format],
+                                        'start': part['DateTime'].iloc[0].isoformat(),
+                                        'rows': 0}
+            self.appendPartition(part)
+            self.partitions[key]['end'] = part['DateTime'].iloc[-1].isoformat()
+            self.partitions[key]['rows'] += len(part)
+
+    def appendPartition(self, part):
+        if self.store_format == 'parquet':
+            table = pa.Table.from_pandas(part, schema=self.schema, preserve_index=False)
+            if self.schema is None:
+                self.schema = table.schema
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.folder / self.partitions[self.key]['file'], self.schema, compression=config.store_compression)
+            self.writer.write_table(table)
+        else: # feather and pbz2 partitions are written whole
+            self.parts.append(part)
+
+    def closePartition(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if len(self.parts) > 0:
+            writeFrame(pd.concat(self.parts, ignore_index=True), self.folder / self.partitions[self.key]['file'], self.store_format)
+            self.parts = []
+
+    def close(self):
+        self.closePartition()
+        return self.partitions
+
+    def filledColumns(self):
+        # Columns with any data (all NaN columns are dropped from all_data)
+        return ['DateTime'] + [col for col in (self.columns or []) if col in self.filled and col != 'DateTime']
+
+def writeMeta(folder, meta):
+    meta['saved'] = datetime.now(timezone('UTC')).isoformat()
+    with open(folder / "meta.tmp", 'w') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+    os.replace(folder / "meta.tmp", folder / "meta.json")
+
+def monthStart(date):
+    return pd.Timestamp(year=date.year, month=date.month, day=1, tz='UTC')
+
+def canUpdate(columns, store_format = None, folder = None):
+    # Whether partitions can be replaced from a month onwards rather than rewriting the store
+    if store_format is None:
+        store_format = config.store_format
+    meta = readMeta(folder)
+    return meta is not None and meta['format'] == store_format and set(columns) <= set(meta['columns'])
+
+def writeStream(chunks, store_format = None, since = None, columns = None, folder = None):
+    # Write DateTime ordered chunks of all_data (or another partitioned folder) to the store
+    # If since is given only the partitions from the month of since onwards are replaced
+    if store_format is None:
+        store_format = config.store_format
+    if store_format not in store_formats:
+        raise ValueError("Unknown store format: " + str(store_format))
+    if folder is None:
+        folder = storeFolder()
+    if since is None:
+        temp_folder = folder.with_name(folder.name + "_tmp")
+    else:
+        temp_folder = folder / "update_tmp"
+    if os.path.exists(temp_folder):
+        shutil.rmtree(temp_folder)
+    temp_folder.mkdir(parents=True)
+
+    writer = PartitionWriter(temp_folder, store_format, columns)
+    for chunk in chunks:
+        writer.write(chunk)
+    partitions = writer.close()
+
+    if since is None:
+        # Swap in the new store when complete
+        meta = {'version': STORE_VERSION,
+                'format': store_format,
+                'columns': writer.filledColumns() if writer.columns is not None else [],
+                'partitions': partitions}
+        writeMeta(temp_folder, meta)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.replace(temp_folder, folder)
+    else:
+        meta = readMeta(folder)
+        since = utcTimestamp(since)
+        since_key = since.year * 100 + since.month
+        for key in list(meta['partitions']):
+            if int(key) >= since_key and key not in partitions:
+                os.remove(folder / meta['partitions'].pop(key)['file'])
+        for key in partitions:
+            os.replace(temp_folder / partitions[key]['file'], folder / partitions[key]['file'])
+            meta['partitions'][key] = partitions[key]
+        shutil.rmtree(temp_folder)
+        writeMeta(folder, meta)
+
+def saveAllData(df, store_format = None, since = None):
+    # Write all_data to the store, only rewriting partitions from the month of `since` if given
+    df = df.reset_index(drop=True)
+    if since is not None and canUpdate(df.columns, store_format):
+        since = utcTimestamp(since)
+        df = df.iloc[df['DateTime'].searchsorted(monthStart(since)):]
+        writeStream([df], store_format, since, readMeta()['columns'])
+    else:
+        writeStream([df], store_format)
+
+# Month split runs for streaming ingestion
+# Each batch of imported files is spilled to one file per calendar month so that the months
+# can later be sorted and processed one at a time.
+def spillRun(df, folder, run):
+    # Write a DateTime sorted batch as Ingest/YYYYMM/run_XXXXX.parquet files
+    keys = partitionKeys(df['DateTime'])
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1, [len(df)]))
+    for i in range(len(bounds) - 1):
+        month_folder = folder / str(keys[bounds[i]])
+        month_folder.mkdir(parents=True, exist_ok=True)
+        df.iloc[bounds[i]:bounds[i + 1]].to_parquet(month_folder / ("run_" + str(run).zfill(5) + ".parquet"),
+                                                    engine='pyarrow', compression='lz4', index=False)
+
+def runMonths(folder):
+    if not os.path.exists(folder):
+        return []
+    return sorted(os.listdir(folder))
+
+def runColumns(filepath):
+    return pq.read_schema(filepath).names
+
+def readRuns(folder, month):
+    # Read all runs for a month in run order
+    runs = [pd.read_parquet(folder / month / run, engine='pyarrow') for run in sorted(os.listdir(folder / month))]
+    return pd.concat(runs, axis=0, ignore_index=True)
+
+def selectColumns(all_columns, columns):
+    if columns is None:
+        return None
+    return ['DateTime'] + [col for col in all_columns if col in columns and col != 'DateTime']
+
+def utcTimestamp(date):
+    date = pd.Timestamp(date)
+    if date.tzinfo is None:
+        return date.tz_localize('UTC')
+    return date.tz_convert('UTC')
+
+def sliceDates(df, start = None, end = None):
+    # Inclusive date range slice of a DateTime sorted dataframe
+    if start is not None:
+        df = df.iloc[df['DateTime'].searchsorted(utcTimestamp(start), side='left'):]
+    if end is not None:
+        df = df.iloc[:df['DateTime'].searchsorted(utcTimestamp(end), side='right')]
+    return df
+
+def iterPartitions(columns = None, start = None, end = None, folder = None):
+    # Yield stored all_data (or another partitioned folder) one partition at a time, restricted to columns and date range
+    meta = readMeta(folder)
+    if meta is None:
+        if folder is None and os.path.exists(legacyFile()):
+            df = readFrame(legacyFile(), 'pbz2')
+            yield sliceDates(df[selectColumns(df.columns, columns) or df.columns], start, end)
+        return
+    read_columns = selectColumns(meta['columns'], columns) or meta['columns']
+    for key in sorted(meta['partitions']):
+        partition = meta['partitions'][key]
+        if start is not None and pd.Timestamp(partition['end']) < utcTimestamp(start):
+            continue
+        if end is not None and pd.Timestamp(partition['start']) > utcTimestamp(end):
+            continue
+        df = readPartition(meta, key, read_columns, folder)
+        yield sliceDates(df, start, end)
+
+def readPartition(meta, key, columns = None, folder = None):
+    if folder is None:
+        folder = storeFolder()
+    return readFrame(folder / meta['partitions'][key]['file'], meta['format'], selectColumns(meta['columns'], columns) or meta['columns'])
+
+def loadAllData(columns = None, start = None, end = None):
+    meta = readMeta()
+    parts = list(iterPartitions(columns, start, end))
+    if len(parts) == 0:
+        if meta is None:
+            return None
+        return pd.DataFrame(columns=selectColumns(meta['columns'], columns) or meta['columns'])
+    df = pd.concat(parts, axis=0, ignore_index=True)
+    return df
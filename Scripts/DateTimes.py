@@ -0,0 +1,140 @@
+# Import packages
+import re
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Vectorised DateTime parsing for data imports
+# The format of a column is detected once from its first value (and remembered for values of the same
+# shape, so each file of a dataset is only checked against the candidate formats once). Fixed width
+# numeric formats such as %d/%m/%Y %H:%M:%S are then parsed by slicing the digits out of a byte array,
+# other formats (or columns that do not match) with pd.to_datetime. Timezones are converted in bulk.
+
+DATETIME_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+                    "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y")
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d")
+TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%H:%M:%S.%f")
+
+FIELD_WIDTHS = {'%Y': 4, '%m': 2, '%d': 2, '%H': 2, '%M': 2, '%S': 2} # fixed width numeric fields
+FIELD_DEFAULTS = {'%Y': 1900, '%m': 1, '%d': 1, '%H': 0, '%M': 0, '%S': 0} # as strptime
+FIELD_MAX = {'%m': 12, '%d': 31, '%H': 23, '%M': 59, '%S': 59}
+
+format_cache = {} # dict of (value shape, formats): format
+
+def valueShape(value):
+    # Value with each digit replaced by 0, e.g. 00/00/0000 00:00:00
+    return re.sub(r'\d', '0', value)
+
+def detectFormat(value, formats = DATETIME_FORMATS):
+    # First of formats that value can be parsed with
+    key = (valueShape(value), tuple(formats))
+    if key not in format_cache:
+        for dt_format in formats:
+            try:
+                datetime.strptime(value, dt_format)
+            except ValueError:
+                continue
+            format_cache[key] = dt_format
+            break
+        else:
+            raise ValueError("No date format matches '" + value + "': set dt_format or add it to the date formats")
+    return format_cache[key]
+
+@lru_cache(maxsize=None)
+def fixedLayout(dt_format):
+    # Start position of each field and the literal characters of dt_format if it only has fixed width
+    # numeric fields, and the width of its values, else None
+    fields = {}
+    literals = []
+    pos = 0
+    i = 0
+    while i < len(dt_format):
+        if dt_format[i] == '%':
+            directive = dt_format[i:i + 2]
+            if directive not in FIELD_WIDTHS or directive in fields:
+                return None
+            fields[directive] = pos
+            pos += FIELD_WIDTHS[directive]
+            i += 2
+        else:
+            literals.append((pos, ord(dt_format[i])))
+            pos += 1
+            i += 1
+    return fields, tuple(literals), pos
+
+def fixedFields(values, dt_format):
+    # dict of field: int64 array of values in dt_format, or None if the format is not fixed width
+    # or any value does not match it
+    layout = fixedLayout(dt_format)
+    if layout is None:
+        return None
+    fields, literals, width = layout
+    try:
+        chars = np.asarray(values, dtype='S' + str(width + 1)) # one extra byte to catch longer values
+    except (UnicodeEncodeError, ValueError, TypeError):
+        return None
+    chars = chars.view(np.uint8).reshape(-1, width + 1)
+    ok = (chars[:, width] == 0) & (chars[:, width - 1] != 0)
+    for pos, char in literals:
+        ok &= chars[:, pos] == char
+    parsed = {}
+    for field, start in fields.items():
+        value = np.zeros(len(chars), dtype=np.int32)
+        for pos in range(start, start + FIELD_WIDTHS[field]):
+            digit = chars[:, pos] - np.uint8(ord('0')) # non digits wrap round to > 9
+            ok &= digit <= 9
+            value = value * 10 + digit
+        if field in FIELD_MAX:
+            ok &= (value >= (1 if field in ('%m', '%d') else 0)) & (value <= FIELD_MAX[field])
+        parsed[field] = value
+    if not ok.all():
+        return None
+    return parsed
+
+def fieldsToDatetimes(fields):
+    # Naive datetime64[ns] array from dicts of field values, or None if a day is not in its month
+    field = lambda name: fields.get(name, FIELD_DEFAULTS[name])
+    months = (np.asarray(field('%Y')) - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (np.asarray(field('%m')) - 1)
+    days = months.astype('datetime64[D]') + (np.asarray(field('%d')) - 1)
+    if not (days.astype('datetime64[M]') == months).all(): # e.g. 31/02
+        return None
+    seconds = (np.asarray(field('%H')) * 60 + np.asarray(field('%M'))) * 60 + np.asarray(field('%S'))
+    return days.astype('datetime64[ns]') + seconds.astype('timedelta64[s]')
+
+def firstValue(values):
+    if len(values) > 0 and not pd.isna(values.iloc[0]):
+        return str(values.iloc[0])
+    values = values.dropna()
+    return None if len(values) == 0 else str(values.iloc[0])
+
+def parseDatetimes(values, tz = 'UTC', dt_format = None, times = None, time_format = None):
+    # UTC DateTime series from a column of date strings recorded in timezone tz (or columns of dates
+    # and times, which are parsed separately rather than joined)
+    values = pd.Series(values)
+    sample = firstValue(values)
+    if sample is None:
+        return pd.Series(pd.DatetimeIndex([pd.NaT] * len(values)).tz_localize('UTC'), index=values.index)
+    if dt_format is None:
+        dt_format = detectFormat(sample, DATETIME_FORMATS if times is None else DATE_FORMATS)
+    if times is not None:
+        times = pd.Series(times, index=values.index)
+        if time_format is None and firstValue(times) is not None:
+            time_format = detectFormat(firstValue(times), TIME_FORMATS)
+
+    naive = None
+    fields = None
+    if times is None or time_format is not None: # no times at all are left to pd.to_datetime
+        fields = fixedFields(values.to_numpy(), dt_format)
+    if fields is not None and times is not None:
+        time_fields = fixedFields(times.to_numpy(), time_format)
+        fields = None if time_fields is None or set(fields) & set(time_fields) else dict(fields, **time_fields)
+    if fields is not None:
+        naive = fieldsToDatetimes(fields)
+    if naive is None: # not fixed width: parse the strings
+        if times is not None:
+            values = values + " " + times
+            dt_format = None if time_format is None else dt_format + " " + time_format
+        naive = pd.to_datetime(values, format=dt_format).to_numpy()
+
+    return pd.Series(pd.DatetimeIndex(naive).tz_localize(tz).tz_convert('UTC'), index=values.index)
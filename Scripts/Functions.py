@@ -1,23 +1,33 @@
-import os
-import shutil
+import io
 import time
 import pandas as pd
 import numpy as np
 import re
+import json
 import webbrowser
 import dash_bootstrap_components as dbc
-from dash import html
+from dash import html, dcc
 from pytz import timezone
 import math
 import humanize
 from datetime import datetime
-from copy import deepcopy
 import plotly
 from PIL import Image
 import warnings
-from PyPDF2 import PdfFileMerger, PdfFileReader, PdfFileWriter
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.pdf import PageObject
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
 
 import Scripts.config as config
+import Scripts.DataAccess as DataAccess
+import Scripts.Pyramid as Pyramid
+import Scripts.ChartCache as ChartCache
+import Scripts.MetaIndex as MetaIndex
+import Scripts.ConfigStore as ConfigStore
+import Scripts.Jobs as Jobs
+import Scripts.Renderer as Renderer
+import Scripts.HtmlExport as HtmlExport
+import Scripts.DataExport as DataExport
 
 def update_text():
     diff = datetime.now(timezone('UTC')) - config.config['date_end']
@@ -58,6 +68,14 @@ def resampleAlert(value):
     else:
         return ""
 
+def downsampleAlert(budget):
+    return dbc.Alert('Downsampled to ' + str(budget) + ' points (min/max)', color="secondary", class_name = "mb-0 py-0")
+
+def calcDownsampler(resolution):
+    if resolution == 'SHAPE':
+        return config.point_budget
+    return 0
+
 def calcResampler(resolution, set, hi_res):
     if resolution == 'HIGH':
         value = hi_res
@@ -66,376 +84,413 @@ def calcResampler(resolution, set, hi_res):
             value = 4
         else:
             value = hi_res*4
-    elif resolution == 'NONE':
+    elif resolution == 'NONE' or resolution == 'SHAPE':
         value = 0
     elif resolution == 'SET':
         value = set
     return(value)
 
 def calcHiRes(dates_selected):
-        data_set = config.data['all_data'].query(
-            'DateTime > "' + str(unixToDatetime(dates_selected[0])) + '"').query(
-            'DateTime < "' + str(unixToDatetime(dates_selected[1])) + '"')
-        length = len(data_set)
-        return round(length/2800) #mins
-
-def addDatatoPlot(plot, traces_info, chart_data, dates_selected, plots, height):
-    plot_name = config.config['dcc_plot_codes'][plot.id]
-    if any(config.config['plot_pars'].query("plot == '" + plot_name + "'")['bar']):
-        plot_traces = traces_info[plot.id]
-        bars = list(config.config['plot_pars'].query(
-            "plot == '" + plot_name + "'").query(
-            "parameter_lab in @plot_traces")['bar_order'].unique())
-        bar_orders = {}
-        for b in range(0, len(bars), 1):
-            bar_orders[bars[b]] = len(bars) - 1 - b
-    for trace in plot.figure.data:
-        if trace.name in traces_info[plot.id]:
-            par = config.config['plot_pars'].query(
-                "plot == '" + plot_name + "'").query(
-                "parameter_lab == '" + trace.name + "'")['parameter'][0]
-            par_info = config.config['plot_pars'].query('parameter == "' + par + '"')
-            x_data = deepcopy(chart_data.DateTime)
-            y_data = deepcopy(chart_data[par])
-            error_bars = False
-            y_error = None
-            if par + "_err" in config.data['all_data'].columns[1:]:
-                error_bars = True
-                y_error = deepcopy(chart_data[par + "_err"])
-
-            if trace.mode == "markers" or trace.line.shape == "hv" or par_info['point'][0] or par_info['bar'][0]:
-                if error_bars:
-                    y_error.drop(y_error[np.isnan(y_data)].index, inplace=True)
-                x_data.drop(x_data[np.isnan(y_data)].index, inplace=True)
-                y_data.drop(y_data[np.isnan(y_data)].index, inplace=True)
-            trace.x = x_data
-            trace.y = y_data
-            if trace.mode == "markers":
-                trace.update(error_y = dict(type = 'data', visible = True, array = y_error, color = par_info['colour'][0]))
-            if trace.mode == "none" and par_info['ribbon'][0]:
-                trace.y = y_data - y_error
-            if trace.line.width == 0 and par_info['ribbon'][0]:
-                trace.y = y_data + y_error
-            if trace.line.shape == "hv" and par_info['bar'][0]:
-                trace.y = bar_orders[par_info['bar_order'][0]] + y_data.round()/2
-            if trace.mode == "none" and par_info['bar'][0]:
-                trace.y = bar_orders[par_info['bar_order'][0]] - y_data.round()/2
-    plot.figure.update_xaxes(range=[unixToDatetime(dates_selected[0]), unixToDatetime(dates_selected[1])], fixedrange=False)
-    plot.style['height'] = str(height) + 'vh'
-    if plot.id == list(plots.keys())[len(plots)-1]:
-        plot.style['height'] = str(height + 5) + 'vh'
-    return plot
+        length = DataAccess.rangeCount(unixToDatetime(dates_selected[0]), unixToDatetime(dates_selected[1]))
+        return round(length/config.point_budget) #mins
+
+def mergeDict(base, updates):
+    # Copy of base with updates merged in, copying only the nested dicts that change
+    merged = dict(base)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = mergeDict(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def updateLayout(figure, layout):
+    # Figure dict with layout updates merged in, leaving the template dicts unchanged
+    return {'data': figure['data'], 'layout': mergeDict(figure['layout'], layout)}
+
+def plotTemplate(plot_id):
+    # Plain dict figure of a graph, loaded from the app config the first time it is used
+    if plot_id not in config.figs['plot_templates']:
+        config.figs['plot_templates'][plot_id] = ConfigStore.loadTemplate(plot_id)
+    return config.figs['plot_templates'][plot_id]
+
+def addDatatoPlot(plot_id, traces_info, chart_data, dates_selected, plots, height, budget = 0):
+    # New graph from the plot template with the chart data columns as numpy arrays (not copied unless gaps are removed)
+    # budget: points kept per trace of downsampled chart data (DataAccess.decimate), 0 keeps every point
+    template = plotTemplate(plot_id)
+    plot_info = MetaIndex.plotInfo(config.config['dcc_plot_codes'][plot_id])
+    plot_traces = traces_info[plot_id]
+    if plot_info.has_bar:
+        bar_orders = plot_info.barOrders(plot_traces)
+    x_values = chart_data['DateTime'].values
+    data = []
+    for trace in template['data']:
+        if trace.get('name') not in plot_traces:
+            data.append(trace)
+            continue
+        par_info = plot_info.labels[trace['name']]
+        par = par_info.parameter
+        mode = trace.get('mode')
+        line = trace.get('line', {})
+        x_data = x_values
+        y_data = chart_data[par].to_numpy()
+        y_error = None
+        if par + "_err" in chart_data.columns:
+            y_error = chart_data[par + "_err"].to_numpy()
+        if budget > 0:
+            x_data, arrays = DataAccess.decimate(x_data, {'y': y_data, 'error_y': y_error}, budget)
+            y_data, y_error = arrays['y'], arrays['error_y']
+
+        if mode == "markers" or line.get('shape') == "hv" or par_info.point or par_info.bar:
+            keep = ~np.isnan(y_data)
+            if not keep.all():
+                if y_error is not None:
+                    y_error = y_error[keep]
+                x_data = x_data[keep]
+                y_data = y_data[keep]
+        trace = dict(trace, x=x_data, y=y_data)
+        if mode == "markers":
+            trace['error_y'] = dict(trace.get('error_y', {}), type = 'data', visible = True, array = y_error, color = par_info.colour)
+        if mode == "none" and par_info.ribbon:
+            trace['y'] = y_data - y_error
+        if line.get('width') == 0 and par_info.ribbon:
+            trace['y'] = y_data + y_error
+        if line.get('shape') == "hv" and par_info.bar:
+            trace['y'] = bar_orders[par_info.bar_order] + np.round(y_data)/2
+        if mode == "none" and par_info.bar:
+            trace['y'] = bar_orders[par_info.bar_order] - np.round(y_data)/2
+        data.append(trace)
+    layout = mergeDict(template['layout'], dict(xaxis=dict(range=[unixToDatetime(dates_selected[0]), unixToDatetime(dates_selected[1])], fixedrange=False)))
+    style = dict(template['style'], height=str(height) + 'vh')
+    if plot_id == list(plots.keys())[len(plots)-1]:
+        style['height'] = str(height + 5) + 'vh'
+    return dcc.Graph(id=plot_id, figure={'data': data, 'layout': layout}, style=style)
 
 def getPlots(plot_set):
     plots = {}
     for plot_name in config.config['plot_set_plots'][plot_set].keys():
-        for plot in config.figs['dcc_plot_figs']:
-            if plot_name == plot.id:  
-                plots[plot.id] = re.sub('<.*?>', ' ', plot.figure.layout.yaxis.title.text)
+        for plot_id in config.config['dcc_plot_names']:
+            if plot_name == plot_id:
+                plots[plot_id] = config.config['dcc_plot_names'][plot_id]
     return plots
 
 def modifyPlot(plot_fig, plot, plots, font):
-    plot_info = config.config['info']['plots'].query("index == '" + plot + "'")
-    plot_fig.figure.update_layout(
+    plot_info = MetaIndex.plotInfo(plot)
+    # the template layout already has the simple_white template from CreateCharts.modifyPlot
+    plot_fig.figure = updateLayout(plot_fig.figure, dict(
         margin=dict(l=125, r=250, b=15, t=15, pad=10),
-        template="simple_white",
         paper_bgcolor='rgba(0,0,0,0)',
-        legend_tracegroupgap=0,
+        legend=dict(tracegroupgap=0),
         font=dict(
             family = "Arial",
             size = font,
             color = "black"
-        ))
-    plot_fig.figure.update_yaxes(title_text=plot_info['ylab'][0], mirror=True)
-    plot_fig.figure.update_xaxes(showgrid=True, showticklabels=False, ticks="",
-        showline=True, mirror=True,
-        fixedrange=True) #prevent x zoom
+        ),
+        yaxis=dict(title=dict(text=plot_info.ylab), mirror=True),
+        xaxis=dict(showgrid=True, showticklabels=False, ticks="",
+            showline=True, mirror=True,
+            fixedrange=True))) #prevent x zoom
     if plot_fig.id == list(plots.keys())[len(plots)-1]:
-        plot_fig.figure.update_xaxes(showticklabels=True, ticks="outside", automargin=False)
-        plot_fig.figure.update_layout(margin=dict(l=125, r=250, b=60, t=15, pad=10))
+        plot_fig.figure = updateLayout(plot_fig.figure, dict(
+            xaxis=dict(showticklabels=True, ticks="outside", automargin=False),
+            margin=dict(l=125, r=250, b=60, t=15, pad=10)))
     return(plot_fig)
 
-def getYMin(plot, chart_data, traces_info):
-    plot_info = config.config['info']['plots'].query("index == '" + plot + "'")
-    if pd.isna(plot_info['ymin'][0]):
-        par_codes = config.config['plot_pars'].query("plot == '" + plot + "'").query("parameter_lab in @traces_info")['parameter'].unique()
-        min_data = []
-        for par in par_codes:
-            if par + "_err" in chart_data.columns:
-                min_data.append(min(chart_data[par] - chart_data[par + "_err"]))
-            else:
-                min_data.append(min(chart_data[par]))
-        ymin = min(min_data)
-        if any(config.config['plot_pars'].query('plot == "' + plot + '"')['point']):
+def columnExtents(chart_data, pars):
+    # Minimum of value - error and maximum of value + error of each parameter, ignoring NaNs
+    values = chart_data[pars].to_numpy(dtype=float)
+    lows = highs = values
+    err_cols = [i for i, par in enumerate(pars) if par + "_err" in chart_data.columns]
+    if len(err_cols) > 0:
+        errors = np.zeros_like(values)
+        errors[:, err_cols] = chart_data[[pars[i] + "_err" for i in err_cols]].to_numpy(dtype=float)
+        lows = values - errors
+        highs = values + errors
+    mins = np.fmin.reduce(lows, axis=0, initial=np.nan)
+    maxs = np.fmax.reduce(highs, axis=0, initial=np.nan)
+    return dict(zip(pars, mins)), dict(zip(pars, maxs))
+
+def getYMin(plot_info, mins, traces_info):
+    if pd.isna(plot_info.ymin):
+        ymin = np.fmin.reduce([mins[par] for par in plot_info.parCodes(traces_info)], initial=np.nan)
+        if plot_info.has_point:
             if ymin > 0:
                 ymin = 0.95 * ymin
             else:
                 ymin = 1.05 * ymin
-        elif any(config.config['plot_pars'].query('plot == "' + plot + '"')['bar']) > 0:
+        elif plot_info.has_bar:
             ymin = - 1
     else:
-        ymin = plot_info['ymin'][0]
+        ymin = plot_info.ymin
     return(ymin)
 
-def getYMax(plot, chart_data, traces_info):
-    plot_info = config.config['info']['plots'].query("index == '" + plot + "'")
-    if pd.isna(plot_info['ymax'][0]):
-        par_codes = config.config['plot_pars'].query("plot == '" + plot + "'").query("parameter_lab in @traces_info")['parameter'].unique()
-        max_data = []
-        for par in par_codes:
-            if par + "_err" in chart_data.columns:
-                max_data.append(max(chart_data[par] + chart_data[par + "_err"]))
-            else:
-                max_data.append(max(chart_data[par]))
-        ymax = max(max_data)
-        if any(config.config['plot_pars'].query('plot == "' + plot + '"')['point']):
+def getYMax(plot_info, maxs, traces_info):
+    if pd.isna(plot_info.ymax):
+        ymax = np.fmax.reduce([maxs[par] for par in plot_info.parCodes(traces_info)], initial=np.nan)
+        if plot_info.has_point:
             if ymax > 0:
                 ymax = 1.05 * ymax
             else:
                 ymax = 0.95 * ymax
-        elif any(config.config['plot_pars'].query('plot == "' + plot + '"')['bar']) > 0:
-            bars = list(config.config['plot_pars'].query(
-                "plot == '" + plot + "'").query(
-                "parameter_lab in @traces_info")['bar_order'].unique())
-            ymax = len(bars)
+        elif plot_info.has_bar:
+            ymax = len(plot_info.barOrders(traces_info))
     else:
-        ymax = plot_info['ymax'][0]
+        ymax = plot_info.ymax
     return(ymax)
 
-def setAxisRange(plot_fig, plot, chart_data, traces_info):
-    plot_info = config.config['info']['plots'].query("index == '" + plot + "'")
-    ymin = getYMin(plot, chart_data, traces_info)
-    ymax = getYMax(plot, chart_data, traces_info)
-    if plot_info['log'][0] == True:
-        plot_fig.figure.update_layout(yaxis_type="log")
-        plot_fig.figure.update_yaxes(range=[math.log(ymin, 10), math.log(ymax, 10)])
+def axisRanges(chart_data, plots, traces):
+    # y axis range of every plot from one pass over the chart data columns
+    plot_infos = {plot_id: MetaIndex.plotInfo(config.config['dcc_plot_codes'][plot_id]) for plot_id in plots}
+    pars = list(dict.fromkeys(par for plot_id, plot_info in plot_infos.items() for par in plot_info.parCodes(traces[plot_id])))
+    mins, maxs = columnExtents(chart_data, pars)
+    y_ranges = {}
+    for plot_id, plot_info in plot_infos.items():
+        y_ranges[plot_id] = [getYMin(plot_info, mins, traces[plot_id]), getYMax(plot_info, maxs, traces[plot_id])]
+    return y_ranges
+
+def setAxisRange(plot_fig, plot, y_range, traces_info):
+    plot_info = MetaIndex.plotInfo(plot)
+    ymin, ymax = y_range
+    if plot_info.log == True:
+        plot_fig.figure = updateLayout(plot_fig.figure, dict(yaxis=dict(type="log", range=[math.log(ymin, 10), math.log(ymax, 10)])))
     else:
-        plot_fig.figure.update_yaxes(range=[ymin, ymax])
-
-    if any(config.config['plot_pars'].query('plot == "' + plot + '"')['bar'].values == True):
-        bar_dict = config.config['plot_pars'].query('plot == "' + plot + '"').set_index('bar_order')['parameter_lab'].to_dict()
-        bars = list(config.config['plot_pars'].query(
-            "plot == '" + plot + "'").query(
-            "parameter_lab in @traces_info")['bar_order'].unique())
-        bar_orders = {}
-        for b in range(0, len(bars), 1):
-            bar_orders[bars[b]] = len(bars) - 1 - b
+        plot_fig.figure = updateLayout(plot_fig.figure, dict(yaxis=dict(range=[ymin, ymax])))
+
+    if plot_info.bar_ticks:
+        bar_orders = plot_info.barOrders(traces_info)
         bar_dict2 = {}
         for key in bar_orders:
-            bar_dict2[bar_orders[key]] = bar_dict[key]
+            bar_dict2[bar_orders[key]] = plot_info.bar_labels[key]
         
-        #tickvals_list = list(range(int(ymin)+1, int(ymax), 1))
-        #tickvals_list = list(config.config['plot_pars'].query('parameter_lab in @traces_info').query('plot == "' + plot + '"')['bar_order'].unique())
         tickvals_list = list(bar_dict2.keys())
         tickvals_list.sort()
         ticktext_list = [bar_dict2[k] for k in tickvals_list if k in bar_dict2]
-        plot_fig.figure.update_layout(
+        plot_fig.figure = updateLayout(plot_fig.figure, dict(
                 yaxis = dict(
                     tickmode = 'array',
                     tickvals = tickvals_list,
-                    ticktext = ticktext_list
+                    ticktext = ticktext_list,
+                    ticklabelposition="inside", ticks="inside", automargin=False
                 )
-            )
-        plot_fig.figure.update_yaxes(ticklabelposition="inside", ticks="inside", automargin=False)
+            ))
 
     return(plot_fig)
 
-def create_chart_data(dates_selected, resample, traces):
-    chart_data = config.data['all_data'].query(
-            'DateTime > "' + str(unixToDatetime(dates_selected[0])) + '"').query(
-            'DateTime < "' + str(unixToDatetime(dates_selected[1])) + '"').set_index('DateTime')
-
+def chartColumns(traces):
+    # all_data columns of the selected traces (with their _err columns) and of their values only
+    data_columns = config.data['all_data'].columns[1:]
     trace_codes = []
+    value_codes = []
     for plot_id in traces:
         plot_name = config.config['dcc_plot_codes'][plot_id]
-        trace_list = traces[plot_id]
-        par_codes = list(config.config['plot_pars'].query('plot == "' + plot_name + '"').query('parameter_lab in @trace_list')['parameter'].unique())
+        par_codes = MetaIndex.plotInfo(plot_name).parCodes(traces[plot_id])
         err_codes = [p + "_err" for p in par_codes]
-        codes = chart_data.columns[chart_data.columns.isin(par_codes + err_codes)]
+        codes = data_columns[data_columns.isin(par_codes + err_codes)]
         trace_codes.extend(codes)
-    chart_data = chart_data[trace_codes]
-    if resample > 0:
-        chart_data = chart_data.groupby(pd.Grouper(freq=str(resample) +'Min')).aggregate(np.mean)
-        chart_data = chart_data.dropna(thresh=1)
+        value_codes.extend(data_columns[data_columns.isin(par_codes)])
+    return trace_codes, value_codes
+
+def create_chart_data(dates_selected, resample, traces, downsample = 0):
+    trace_codes, value_codes = chartColumns(traces)
+    start, end = unixToDatetime(dates_selected[0]), unixToDatetime(dates_selected[1])
+    level = None
+    if resample > 0 and DataAccess.rangeCount(start, end) > 0:
+        level = Pyramid.levelFor(resample)
+    if level is not None: # resample from pre-aggregated level
+        chart_data = Pyramid.resampleRange(start, end, trace_codes, resample, level)
+    elif downsample > 0 and resample == 0: # shape preserving downsample of the raw data
+        chart_data = DataAccess.rangeDownsample(start, end, ['DateTime'] + trace_codes,
+                                                list(dict.fromkeys(value_codes)), downsample).set_index('DateTime')
+    else:
+        chart_data = DataAccess.rangeSlice(start, end, ['DateTime'] + trace_codes).set_index('DateTime')
+        if resample > 0:
+            chart_data = chart_data.groupby(pd.Grouper(freq=str(resample) +'Min')).aggregate(np.mean)
+            chart_data = chart_data.dropna(thresh=1)
     chart_data = chart_data.reset_index()
     return chart_data
 
-def create_chart_content(chart_data, dates_selected, plots, traces, height, font):
+def cached_chart_data(data_key, dates_selected, resample, traces, downsample = 0):
+    # data_key: ChartCache.dataKey of the request, made once per job so the data and content are cached under the same all_data version
+    chart_data = ChartCache.cache.get(data_key)
+    if chart_data is None:
+        chart_data = create_chart_data(dates_selected, resample, traces, downsample)
+        ChartCache.cache.set(data_key, chart_data, ChartCache.frameBytes(chart_data))
+    return chart_data.copy() # callers may change their frame, never the cached one
+
+def cached_chart_content(chart_data, data_key, dates_selected, downsample, plots, traces, height, font):
+    # Chart content as component JSON, from the cache if the same charts have been made before
+    content_key = ChartCache.contentKey(data_key, plots, height, font)
+    content_json = ChartCache.cache.get(content_key)
+    if content_json is None:
+        content = create_chart_content(chart_data, dates_selected, plots, traces, height, font, downsample)
+        content_json = json.dumps(content, cls=plotly.utils.PlotlyJSONEncoder)
+        ChartCache.cache.set(content_key, content_json, ChartCache.textBytes(content_json))
+    else:
+        Jobs.setProgress(1)  # update progress
+    if config.verbose:
+        print("Chart cache: " + str(ChartCache.cache.stats()))
+    return json.loads(content_json)
+
+def create_chart_content(chart_data, dates_selected, plots, traces, height, font, downsample = 0):
     content = []
-    for plot_orig in config.figs['dcc_plot_figs']:
-        if plot_orig.id in plots:
-            plot_name = config.config['dcc_plot_codes'][plot_orig.id]
-            plot = addDatatoPlot(deepcopy(plot_orig), traces, chart_data, dates_selected, plots, height)
+    y_ranges = axisRanges(chart_data, plots, traces)
+    for plot_id in config.config['dcc_plot_codes']:
+        if plot_id in plots:
+            plot_name = config.config['dcc_plot_codes'][plot_id]
+            plot = addDatatoPlot(plot_id, traces, chart_data, dates_selected, plots, height, downsample)
             plot = modifyPlot(plot, plot_name, plots, font)
-            plot = setAxisRange(plot, plot_name, chart_data, traces[plot_orig.id])
+            plot = setAxisRange(plot, plot_name, y_ranges[plot_id], traces[plot_id])
             content.append(html.Div(id='loading', children=plot))
-            progress_pc = (list(plots.keys()).index(plot_orig.id) + 2) / (len(plots.keys()) + 1)
-            config.fsc.set("submit_progress", str(progress_pc))  # update progress
+            progress_pc = (list(plots.keys()).index(plot_id) + 2) / (len(plots.keys()) + 1)
+            Jobs.setProgress(progress_pc)  # update progress
     return content
 
-def open_browser(port):
-    webbrowser.open_new("http://localhost:{}".format(port))
+def sortPlots(plots):
+    sorted_keys = sorted(sorted(plots.keys()), key=len) # graph10+ after graph9
+    return dict(sorted(plots.items(), key=lambda pair: sorted_keys.index(pair[0])))
 
-def createOfflineCharts(content, plots, height, export_progress, export_denom):
-    div_chart_fig = {}
-    p = 0
-    for plot in content:
-        div_chart_fig[plot.children.id] = plotly.offline.plot(plot.children.figure, include_plotlyjs=False, output_type='div')
-        div_chart_fig[plot.children.id] = div_chart_fig[plot.children.id].replace('style="height:100%; width:100%;"',
-        'style="height:' + str(height) + '%; width:98%;"')
-        if p == len(plots)-1: #if the last chart
-            div_chart_fig[plot.children.id] = div_chart_fig[plot.children.id].replace('style="height:' + str(height) + '%;"', 'style="height:' + str(height * 1.25) + '%;"')
-        p += 1
-        export_progress_new = export_progress + (p / (len(content) + 1))
-        config.fsc_e.set("export_progress", str(export_progress_new / export_denom))  # update progress
-    return(div_chart_fig)
-
-def exportHTML(offline_chart, dates_selected, resample, export_name):
-    #Build start and end strings
-    html_string_start = '''
-    <html>
-        <head>
-            <style>body{ margin:0 100; background:white; font-family: Arial, Helvetica, sans-serif}</style>
-        </head>
-        <body>
-            <h1>''' + config.config['project'] + ''' interactive data</h1>
-            <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-            '''
-
-    html_string_end = '''
-        </body>
-    </html>'''
-
-    #Create html header
-    html_string = html_string_start
-
-    chart_start_date = unixToDatetime(dates_selected[0])
-    chart_end_date = unixToDatetime(dates_selected[1])
-    html_string = html_string + '''<p>''' + humanize.naturaldate(chart_start_date) + ''' to ''' + humanize.naturaldate(chart_end_date)
-
-    if resample != 0:
-        html_string = html_string + ''' | Data resampled over ''' + str(resample) + ''' minutes'''
-    
-    html_string = html_string + '''</p>'''
-
-    #Add divs to html string
-    for plot in offline_chart:
-        html_string = html_string + offline_chart[plot]
-
-    #write finished html
-    html_string + html_string_end
-    html_filename = export_name + ".html"
-    hreport = open(config.io_dir / "Output" / html_filename,'w', encoding='utf-8')
-    hreport.write(html_string)
-    hreport.close()
-
-def deleteFolderContents(folder):
-    if not os.path.exists(folder):
-        folder.mkdir(parents=True, exist_ok=True)
+def exportName(dates_selected, resample, downsample, plots, plot_set):
+    start = unixToDatetime(dates_selected[0]).strftime("%Y%m%d")
+    end = unixToDatetime(dates_selected[1]).strftime("%Y%m%d")
+    export_name = start + "-" + end + "_"
+    if resample > 0:
+        export_name += str(resample) + "Min_"
+    elif downsample > 0:
+        export_name += "MinMax" + str(downsample) + "_"
+    if plot_set > 0:
+        export_name += "PS" + str(plot_set)
     else:
-        for filename in os.listdir(folder):
-            file_path = folder / filename
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print('Failed to delete %s. Reason: %s' % (file_path, e))
-
-def createTempChartDir(export_name, otype):
-    temp_path = config.io_dir / "Temp" / (otype + "s")
-    deleteFolderContents(temp_path)
-    odir = temp_path /  export_name
-    odir.mkdir(parents=True, exist_ok=True)
-    return(odir)
+        export_name += "P" + str(len(plots))
+    return export_name
+
+def submit_charts(dates_selected, resample, downsample, plots, traces, height, font):
+    # Submit job: chart content for the selected plots
+    Jobs.setProgress(1 / (len(plots.keys()) + 1))  # update progress
+    data_key = ChartCache.dataKey(dates_selected, resample, downsample, traces)
+    chart_data = cached_chart_data(data_key, dates_selected, resample, traces, downsample)
+    return cached_chart_content(chart_data, data_key, dates_selected, downsample, sortPlots(plots), traces, height, font)
+
+def export_charts(dates_selected, resample, downsample, plots, traces, plot_set, height, font,
+                  csv_on, html_on, pdf_on, png_on, pdf_size, png_size):
+    # Export job: write the selected exports to Output, returning the export name
+    export_name = exportName(dates_selected, resample, downsample, plots, plot_set)
+    data_key = ChartCache.dataKey(dates_selected, resample, downsample, traces)
+    export_progress = 0
+    export_denom = len([on for on in [csv_on, html_on, pdf_on, png_on] if on])
+    if csv_on:
+        exportData(data_key, dates_selected, resample, traces, downsample, config.io_dir / 'Output' / (export_name + '_data'),
+                   lambda done: Jobs.setProgress((export_progress + done) / export_denom))  # update progress
+        export_progress += 1
+        Jobs.setProgress(export_progress / export_denom)  # update progress
+    if any([html_on, pdf_on, png_on]):
+        chart_data = cached_chart_data(data_key, dates_selected, resample, traces, downsample)
+        plots = sortPlots(plots)
+        with Jobs.stage(export_progress / export_denom, export_progress / export_denom): # figures are part of the first export
+            content = create_chart_content(chart_data, dates_selected, plots, traces, height, font, downsample)
+        if html_on:
+            HtmlExport.exportHTML(content, plots, height, dates_selected, resample, export_name, export_progress, export_denom)
+            export_progress += 1
+            Jobs.setProgress(export_progress / export_denom)  # update progress
+        if pdf_on:
+            exportImage(export_progress, export_denom, export_name, content, plots, "pdf", pdf_size['width'], pdf_size['height'])
+            export_progress += 1
+        if png_on:
+            exportImage(export_progress, export_denom, export_name, content, plots, "png", png_size['width'], png_size['height'], png_size['dpi'])
+            export_progress += 1
+    return export_name
+
+def exportData(data_key, dates_selected, resample, traces, downsample, filepath, progress = None):
+    # Write the chart data to filepath in chunks (config.data_export_format), straight from all_data
+    # unless it is resampled or downsampled
+    trace_codes, value_codes = chartColumns(traces)
+    columns = ['DateTime'] + trace_codes
+    chunk_rows = config.export_chunk_rows
+    if resample == 0 and downsample == 0:
+        start, end = unixToDatetime(dates_selected[0]), unixToDatetime(dates_selected[1])
+        chunks = DataAccess.rangeChunks(start, end, columns, chunk_rows)
+        total_rows = DataAccess.rangeCount(start, end)
+    else: # reduced chart data, as made for the charts
+        chart_data = cached_chart_data(data_key, dates_selected, resample, traces, downsample)
+        chunks = (chart_data.iloc[i:i + chunk_rows] for i in range(0, len(chart_data), chunk_rows))
+        total_rows = len(chart_data)
+    return DataExport.writeChunks(chunks, filepath, total_rows=total_rows, progress=progress, columns=columns)
+
+def open_browser(port):
+    webbrowser.open_new("http://localhost:{}".format(port))
 
 def exportImage(export_progress, export_denom, export_name, content, plots, otype, owidth, oheight, odpi = 300):
-    image_dir = createTempChartDir(export_name, otype.upper())
     divisor = len(plots)-1 + 1.25
     scaler = {'png': odpi/96,
               'pdf': 1}
-    #Export individual images
-    p = 0
-    for plot in content:
+    heights = []
+    for p in range(len(content)):
         height = oheight/divisor
         if p == len(plots)-1: #if the last chart
             height = height * 1.25
-        
-        chart_to_export = deepcopy(plot.children.figure)
-        chart_to_export.update_layout(width=owidth,
-                                            height=height)
-        chart_to_export.write_image(str(image_dir / (str(p).zfill(2) + "_" + plot.children.id + "." + otype)),
-                                            scale=scaler)
-        p = p + 1
+        heights.append(height)
+
+    #Render individual images in parallel
+    def update_progress(done):
+        Jobs.setProgress((export_progress + done / (len(content) + 1)) / export_denom)  # update progress
+    images = Renderer.renderImages([plot.children.figure for plot in content], otype, owidth, heights, scaler[otype], update_progress)
 
     #Combine individual images and output to file
     if otype == 'png':
-        combinePNG(image_dir, export_name, export_progress, export_denom)
+        combinePNG(images, export_name)
     elif otype == 'pdf':
-        combinePDF(image_dir, export_name, export_progress, export_denom)
-    
-    #Delete temp images
-    try:
-        shutil.rmtree(image_dir)
-    except OSError as e:
-        print ("Error: %s - %s." % (e.filename, e.strerror))
-
-def combinePNG(png_dir, export_name, export_progress, export_denom):
-    images = [Image.open(png_dir / x) for x in os.listdir(png_dir)]
-    widths, heights = zip(*(i.size for i in images))
-
-    max_width = max(widths)
-    total_height = sum(heights)
-
-    new_im = Image.new('RGBA', (max_width, total_height))
-
-    y_offset = 0
-    i = 0
-    for im in images:
-        new_im.paste(im, (0,y_offset))
-        y_offset += im.size[1]
-        i += 1
-        export_progress_new = export_progress + (i) / (len(images) + 1)
-        config.fsc_e.set("export_progress", str(export_progress_new / export_denom))  # update progress
+        combinePDF(images, export_name)
+    export_progress += 1
+    Jobs.setProgress(export_progress / export_denom)  # update progress
+
+def combinePNG(images, export_name):
+    # Stack the plot images top to bottom in one array, padding narrower images with transparency
+    arrays = [np.asarray(Image.open(io.BytesIO(image)).convert('RGBA')) for image in images]
+    max_width = max(array.shape[1] for array in arrays)
+    arrays = [np.pad(array, ((0, 0), (0, max_width - array.shape[1]), (0, 0))) for array in arrays]
+    new_im = Image.fromarray(np.concatenate(arrays, axis=0), 'RGBA')
 
     png_filename = export_name + ".png"
     new_im.save(config.io_dir / "Output" /  png_filename)
-    export_progress += 1
-    config.fsc_e.set("export_progress", str(export_progress / export_denom))  # update progress
 
-def combinePDF(pdf_dir, export_name, export_progress, export_denom):
-    #Combine pdfs
+def pageXObject(page):
+    # Form XObject drawing a pdf page, so it can be placed on another page with its own resources
+    xobject = DecodedStreamObject()
+    xobject.setData(page.getContents().getData())
+    xobject[NameObject('/Type')] = NameObject('/XObject')
+    xobject[NameObject('/Subtype')] = NameObject('/Form')
+    xobject[NameObject('/BBox')] = page.mediaBox
+    xobject[NameObject('/Resources')] = page['/Resources']
+    return xobject
+
+def placeCommand(name, x, y):
+    # Content stream command drawing form xobject name at (x, y), in fixed decimals as PDF numbers have no exponent
+    return 'q 1 0 0 1 %.4f %.4f cm %s Do Q' % (x, y, name)
+
+def combinePDF(images, export_name):
+    # Place the first page of each plot pdf top to bottom on one page in a single pass
     with warnings.catch_warnings():
         warnings.filterwarnings('ignore', r'.*Multiple definitions in dictionary.*')
-        merger = PdfFileMerger(strict=False)
-        for filename in sorted(os.listdir(pdf_dir)):
-            merger.append(PdfFileReader(str(pdf_dir / filename), strict=False))
-        with open(str(pdf_dir / "all_pages.pdf"), 'wb') as fh:
-            merger.write(fh)
-
-        #Create combined pdf on one page
-        with open(str(pdf_dir / 'all_pages.pdf'), 'rb') as input_file:
-            # load input pdf
-            input_pdf = PdfFileReader(input_file, strict=False)
-            num_pages = input_pdf.getNumPages()
-            output_pdf = input_pdf.getPage(num_pages-1)
-
-            for p in reversed(range(0,num_pages-1)):
-                second_pdf = input_pdf.getPage(p)
-                # dimensions for offset from loaded page (adding it to the top)
-                offset_x = 0 # use for x offset -> output_pdf.mediaBox[2]
-                offset_y = output_pdf.mediaBox[3]
-                #merge pdf pages
-                output_pdf.mergeTranslatedPage(second_pdf, offset_x, offset_y, expand=True)
-                export_progress_new = export_progress + (num_pages - p) / (num_pages + 1)
-                config.fsc_e.set("export_progress", str(export_progress_new / export_denom))  # update progress
-
-            # write finished pdf
-            output_file = config.io_dir / "Output" / (export_name + ".pdf")
-            with open(output_file, 'wb') as out_file:
-                    write_pdf = PdfFileWriter()
-                    write_pdf.addPage(output_pdf)
-                    write_pdf.write(out_file)
-            export_progress += 1
-            config.fsc_e.set("export_progress", str(export_progress / export_denom))  # update progress
\ No newline at end of file
+        pages = [PdfFileReader(io.BytesIO(image), strict=False).getPage(0) for image in images]
+        width = max(float(page.mediaBox.getWidth()) for page in pages)
+        total_height = sum(float(page.mediaBox.getHeight()) for page in pages)
+
+        write_pdf = PdfFileWriter()
+        output_pdf = PageObject.createBlankPage(None, width, total_height)
+        xobjects = DictionaryObject()
+        commands = []
+        offset_y = total_height
+        for p, page in enumerate(pages):
+            offset_y = round(offset_y - float(page.mediaBox.getHeight()), 4)
+            name = '/Plot' + str(p)
+            xobjects[NameObject(name)] = write_pdf._addObject(pageXObject(page))
+            commands.append(placeCommand(name, -float(page.mediaBox.getLowerLeft_x()), offset_y - float(page.mediaBox.getLowerLeft_y())))
+        contents = DecodedStreamObject()
+        contents.setData('\n'.join(commands).encode('latin-1'))
+        output_pdf[NameObject('/Resources')] = DictionaryObject({NameObject('/XObject'): xobjects})
+        output_pdf[NameObject('/Contents')] = write_pdf._addObject(contents)
+        write_pdf.addPage(output_pdf)
+
+        # write finished pdf
+        output_file = config.io_dir / "Output" / (export_name + ".pdf")
+        with open(output_file, 'wb') as out_file:
+            write_pdf.write(out_file)
@@ -0,0 +1,121 @@
+# Import packages
+import base64
+import hashlib
+import json
+
+import humanize
+import numpy as np
+import pandas as pd
+import plotly
+from plotly.offline import get_plotlyjs_version
+
+import Scripts.config as config
+import Scripts.DataAccess as DataAccess
+import Scripts.Jobs as Jobs
+
+# Compact interactive HTML export of the chart content
+# Trace x, y and error arrays are written once each as base64 float64 arrays (dates as epoch ms)
+# and referenced by the traces that use them, so a time axis shared by many traces is only stored
+# once. Traces can be reduced to config.html_point_budget points (min/max per time bucket).
+# The file is written plot by plot rather than built as one string.
+
+html_start = '''<html>
+    <head>
+        <meta charset="utf-8">
+        <style>body{ margin:0 100; background:white; font-family: Arial, Helvetica, sans-serif}</style>
+        <script src="https://cdn.plot.ly/plotly-%s.min.js"></script>
+        <script>
+            var arrays = {};
+            function decodeArray(id, data) {
+                var bytes = Uint8Array.from(atob(data), function(c) { return c.charCodeAt(0); });
+                arrays[id] = new Float64Array(bytes.buffer);
+            }
+            function newPlot(id, figure, refs) {
+                refs.forEach(function(ref) {
+                    var trace = figure.data[ref[0]];
+                    if (ref[1] == "error_y") { trace.error_y.array = arrays[ref[2]]; } else { trace[ref[1]] = arrays[ref[2]]; }
+                });
+                Plotly.newPlot(id, figure.data, figure.layout, {responsive: true});
+            }
+        </script>
+    </head>
+    <body>
+        <h1>%s interactive data</h1>
+'''
+
+html_end = '''    </body>
+</html>
+'''
+
+def epochMs(values):
+    return pd.DatetimeIndex(values).asi8 / 10**6
+
+def encodeArray(values):
+    return base64.b64encode(np.ascontiguousarray(values, dtype='<f8').tobytes()).decode('ascii')
+
+class ArrayWriter:
+    # Writes each distinct array once, returning the id traces use to refer to it
+    def __init__(self, file):
+        self.file = file
+        self.ids = {}
+
+    def add(self, values):
+        key = hashlib.blake2b(np.ascontiguousarray(values, dtype='<f8').tobytes(), digest_size=16).hexdigest()
+        if key not in self.ids:
+            self.ids[key] = "a" + str(len(self.ids))
+            self.file.write('        <script>decodeArray("' + self.ids[key] + '", "' + encodeArray(values) + '");</script>\n')
+        return self.ids[key]
+
+def splitFigure(figure, array_writer, budget):
+    # Figure without its data arrays (written by array_writer) and the references to put them back
+    data = []
+    refs = []
+    for t, trace in enumerate(figure['data']):
+        if isinstance(trace.get('x'), np.ndarray) and len(trace['x']) > 0:
+            arrays = {'y': trace['y']}
+            if isinstance(trace.get('error_y', {}).get('array'), np.ndarray):
+                arrays['error_y'] = trace['error_y']['array']
+            x, arrays = DataAccess.decimate(trace['x'], arrays, budget)
+            trace = dict(trace)
+            trace.pop('x')
+            refs.append([t, 'x', array_writer.add(epochMs(x))])
+            for key, values in arrays.items():
+                if key == 'error_y':
+                    trace['error_y'] = dict(trace['error_y'], array=None)
+                else:
+                    trace.pop(key)
+                refs.append([t, key, array_writer.add(values)])
+        data.append(trace)
+    layout = dict(figure['layout'])
+    xaxis = dict(layout.get('xaxis', {}), type='date') # x values are epoch ms
+    if 'range' in xaxis:
+        xaxis['range'] = list(epochMs(pd.to_datetime(xaxis['range'], utc=True)))
+    layout['xaxis'] = xaxis
+    return {'data': data, 'layout': layout}, refs
+
+def exportHTML(content, plots, height, dates_selected, resample, export_name, export_progress, export_denom):
+    chart_start_date = pd.to_datetime(dates_selected[0], unit='s', utc=True)
+    chart_end_date = pd.to_datetime(dates_selected[1], unit='s', utc=True)
+    description = humanize.naturaldate(chart_start_date) + ' to ' + humanize.naturaldate(chart_end_date)
+    if resample != 0:
+        description += ' | Data resampled over ' + str(resample) + ' minutes'
+    if config.html_point_budget > 0:
+        description += ' | Traces reduced to ' + str(config.html_point_budget) + ' points (min/max)'
+
+    html_filename = export_name + ".html"
+    with open(config.io_dir / "Output" / html_filename, 'w', encoding='utf-8') as hreport:
+        hreport.write(html_start % (get_plotlyjs_version(), config.config['project']))
+        hreport.write('        <p>' + description + '</p>\n')
+        array_writer = ArrayWriter(hreport)
+        p = 0
+        for plot in content:
+            graph = plot.children
+            figure, refs = splitFigure(graph.figure, array_writer, config.html_point_budget)
+            plot_height = height
+            if p == len(plots)-1: #if the last chart
+                plot_height = height * 1.25
+            hreport.write('        <div id="' + graph.id + '" style="height:' + str(plot_height) + 'vh; width:98%;"></div>\n')
+            hreport.write('        <script>newPlot("' + graph.id + '", ' + json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder) + ', ' + json.dumps(refs) + ');</script>\n')
+            p += 1
+            Jobs.setProgress((export_progress + p / (len(content) + 1)) / export_denom)  # update progress
+        hreport.write(html_end)
@@ -0,0 +1,68 @@
+# Import packages
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import Scripts.config as config
+
+# Persistent record of the data files imported into all_data
+# Stored as JSON-lines in Output/import_manifest.jsonl, one record per file keyed on the file path
+# with its size, modification time, content hash and the first and last DateTime of its rows.
+# Files are re-read only when new or changed.
+
+def manifestFile():
+    return config.io_dir / "Output" / "import_manifest.jsonl"
+
+def loadManifest(reset = False):
+    config.importer['manifest'] = {}
+    if reset or not os.path.exists(manifestFile()):
+        return
+    with open(manifestFile(), 'r', encoding='utf-8') as mfile:
+        for line in mfile:
+            if line.strip():
+                record = json.loads(line)
+                config.importer['manifest'][record['path']] = record
+
+def saveManifest():
+    temp_path = manifestFile().with_suffix(".tmp")
+    with open(temp_path, 'w', encoding='utf-8') as mfile:
+        for record in config.importer['manifest'].values():
+            mfile.write(json.dumps(record) + "\n")
+    os.replace(temp_path, manifestFile())
+
+def fileHash(file_path):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as hfile:
+        for block in iter(lambda: hfile.read(1 << 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def fileChanged(file_path):
+    # Whether the file is new or its size or modification time has changed (without hashing it)
+    record = config.importer['manifest'].get(str(Path(file_path).resolve()))
+    if record is None:
+        return True
+    stat = os.stat(file_path)
+    return record['size'] != stat.st_size or record['mtime'] != stat.st_mtime_ns
+
+def checkFile(dataset, folder, file_path):
+    # Return a new manifest record if the file is new or changed, else None
+    path = str(Path(file_path).resolve())
+    stat = os.stat(file_path)
+    record = config.importer['manifest'].get(path)
+    if record is not None and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime_ns:
+        return None
+    new_record = {'path': path, 'dataset': dataset, 'folder': int(folder),
+                  'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': fileHash(file_path)}
+    if record is not None and record['hash'] == new_record['hash']:
+        # Touched but unchanged content
+        config.importer['manifest'][path] = dict(record, size=new_record['size'], mtime=new_record['mtime'])
+        return None
+    return new_record
+
+def recordFile(record, df = None):
+    # Record an imported file with the DateTime range of its rows (df as read)
+    if df is not None and len(df) > 0:
+        record = dict(record, first=str(df['DateTime'].min()), last=str(df['DateTime'].max()))
+    config.importer['manifest'][record['path']] = record
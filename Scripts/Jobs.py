@@ -0,0 +1,198 @@
+# Import packages
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dash_extensions.enrich import FileSystemCache
+
+import Scripts.config as config
+
+# Background jobs for the chart and export callbacks
+# Long running work runs in a thread pool (config.job_workers jobs at once) and the callbacks poll
+# the job by its ID for progress and the result. Each session has at most one job of each kind,
+# submitting a new one cancels the job it replaces. Jobs are cancelled cooperatively: the next time
+# a cancelled job reports progress (setProgress) it stops with JobCancelled.
+# When the app is served by several worker processes (config.shared) the state of each job is also
+# written to a FileSystemCache in Temp/jobs, so the worker that polls a job or cancels it does not
+# have to be the one running it.
+
+KEEP_FINISHED = 600 # seconds a finished job is kept for polling
+KEEP_RUNNING = 86400 # seconds the shared state of a running job is kept
+PUBLISH_INTERVAL = 0.25 # seconds between shared progress updates of a job
+CANCEL_CHECK_INTERVAL = 0.5 # seconds between checks for a shared cancel request
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind, session):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.session = session
+        self.status = 'queued' # queued, running, done, cancelled or failed
+        self.progress = 0 # 0-1
+        self.stage = (0, 1) # progress range reported by setProgress
+        self.result = None
+        self.error = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.published = 0 # time the state was last written to the shared store
+        self.cancel_checked = 0 # time the shared store was last checked for a cancel request
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def state(self):
+        return {'kind': self.kind, 'session': self.session, 'status': self.status, 'progress': self.progress,
+                'result': self.result, 'error': self.error, 'finished': self.finished}
+
+class JobState:
+    # Job state read from the shared store (a job run by another worker process)
+    def __init__(self, job_id, state):
+        self.id = job_id
+        for key, value in state.items():
+            setattr(self, key, value)
+
+jobs = {} # dict of job id: Job
+session_jobs = {} # dict of (session, kind): job id
+lock = threading.Lock()
+local = threading.local()
+executor = None
+store = None
+
+def getStore():
+    # Shared job state store, or None if the app is run as one process
+    global store
+    if not config.shared:
+        return None
+    with lock:
+        if store is None:
+            store = FileSystemCache(str(config.io_dir / "Temp" / "jobs"), threshold=0, default_timeout=KEEP_RUNNING)
+    return store
+
+def publish(job, force = True):
+    # Write the job state to the shared store (progress updates at most every PUBLISH_INTERVAL seconds)
+    shared = getStore()
+    if shared is None or (not force and time.time() - job.published < PUBLISH_INTERVAL):
+        return
+    job.published = time.time()
+    shared.set("job_" + job.id, job.state(), timeout=KEEP_FINISHED if job.finished is not None else KEEP_RUNNING)
+
+def cancelRequested(job):
+    # Whether the job has been cancelled, by this process or (checked every CANCEL_CHECK_INTERVAL seconds) another
+    if job.cancelled.is_set():
+        return True
+    shared = getStore()
+    if shared is not None and time.time() - job.cancel_checked > CANCEL_CHECK_INTERVAL:
+        job.cancel_checked = time.time()
+        if shared.has("cancel_" + job.id):
+            job.cancel()
+    return job.cancelled.is_set()
+
+def getExecutor():
+    global executor
+    with lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=config.job_workers, thread_name_prefix="job")
+    return executor
+
+def run(job, fn, args, kwargs):
+    if cancelRequested(job): # cancelled while queued
+        finish(job, 'cancelled')
+        return
+    job.status = 'running'
+    publish(job)
+    local.job = job
+    try:
+        job.result = fn(*args, **kwargs)
+        job.progress = 1
+        status = 'done'
+    except JobCancelled:
+        status = 'cancelled'
+    except Exception as e:
+        traceback.print_exc()
+        job.error = str(e)
+        status = 'failed'
+    finally:
+        local.job = None
+    finish(job, status)
+
+def finish(job, status):
+    job.status = status
+    job.finished = time.time()
+    publish(job)
+
+def prune():
+    # Forget jobs that finished more than KEEP_FINISHED seconds ago
+    expired = [job_id for job_id, job in jobs.items() if job.finished is not None and time.time() - job.finished > KEEP_FINISHED]
+    for job_id in expired:
+        job = jobs.pop(job_id)
+        if session_jobs.get((job.session, job.kind)) == job_id:
+            session_jobs.pop((job.session, job.kind))
+
+def submit(kind, session, fn, *args, **kwargs):
+    # Run fn(*args, **kwargs) in the background as the session's job of this kind, returning the job id
+    job = Job(kind, session)
+    shared = getStore()
+    with lock:
+        prune()
+        previous = session_jobs.get((session, kind))
+        if previous in jobs:
+            jobs[previous].cancel()
+        jobs[job.id] = job
+        session_jobs[(session, kind)] = job.id
+    if shared is not None:
+        previous = shared.get("session_" + str(session) + "_" + kind)
+        if previous is not None:
+            cancel(previous)
+        shared.set("session_" + str(session) + "_" + kind, job.id)
+        publish(job)
+    getExecutor().submit(run, job, fn, args, kwargs)
+    return job.id
+
+def get(job_id):
+    # Job (or JobState of a job of another worker process) by id, None if unknown or expired
+    if job_id in jobs:
+        return jobs[job_id]
+    shared = getStore()
+    if shared is None or job_id is None:
+        return None
+    state = shared.get("job_" + job_id)
+    return None if state is None else JobState(job_id, state)
+
+def cancel(job_id):
+    if job_id in jobs:
+        jobs[job_id].cancel()
+    shared = getStore()
+    if shared is not None and job_id is not None:
+        shared.set("cancel_" + job_id, True, timeout=KEEP_FINISHED)
+
+def currentJob():
+    return getattr(local, 'job', None)
+
+def setProgress(value):
+    # Report the progress (0-1) of the job running in this thread, stopping it if it has been cancelled
+    job = currentJob()
+    if job is None:
+        return
+    if cancelRequested(job):
+        raise JobCancelled()
+    start, end = job.stage
+    job.progress = start + (end - start) * min(max(float(value), 0), 1)
+    publish(job, force=False)
+
+@contextmanager
+def stage(start, end):
+    # Map the progress reported inside the block to the start-end part of the job
+    job = currentJob()
+    if job is None:
+        yield
+        return
+    previous = job.stage
+    job.stage = (start, end)
+    try:
+        yield
+    finally:
+        job.stage = previous
@@ -1,3 +1,4 @@
+import uuid
 from dash import html
 from dash import dcc
 import dash_datetimepicker
@@ -5,6 +6,7 @@ import dash_bootstrap_components as dbc
 
 import Scripts.config as config
 import Scripts.Functions as func
+import Scripts.DataAccess as DataAccess
 
 def prepare_layout():
     components = {}
@@ -13,8 +15,7 @@ def prepare_layout():
     plot_set = min(config.config['plot_sets'])
     charts = config.config['info']['charts']
     chart = min(charts.index)
-    start = min(config.data['all_data'].DateTime)
-    end = max(config.data['all_data'].DateTime)
+    start, end = DataAccess.dateExtent()
 
     components["header_card"] = dbc.Card([
         dbc.CardImg(src=image_filename, top=True),
@@ -135,6 +136,7 @@ def prepare_layout():
             {'label': 'Low', 'value': 'LOW'},
             {'label': 'High', 'value': 'HIGH'},
             {'label': 'None', 'value': 'NONE'},
+            {'label': 'Shape', 'value': 'SHAPE'},
             {'label': 'Set', 'value': 'SET'},
         ],
         value='HIGH',
@@ -152,6 +154,7 @@ def prepare_layout():
         dbc.CardHeader("Resampling Resolution", class_name="card-title",),
         html.Div([
             dcc.Store(id='resampler'),
+            dcc.Store(id='downsampler'),
             dbc.Row([
                 dbc.Col(resampler_radio, style = {'align-self': 'center'}),
                 dbc.Col(resample_set_input, style = {'align-self': 'center'}, width=3)
@@ -192,17 +195,26 @@ def prepare_layout():
     components['submit_card'] = dbc.Card([
         dbc.CardHeader("Load Charts", class_name="card-title",),
         dbc.Row([
-            dcc.Store(id = 'submit_flag'),
+            dcc.Store(id = 'submit_job'),
             dbc.Col(submit_input, width=3, style = {'align-self': 'center'}),
             dbc.Col(submit_progress, style = {'align-self': 'center'})
         ]),
         dbc.Row([
-            dcc.Store(id = 'export_flag'),
+            dcc.Store(id = 'export_job'),
             dbc.Col(export_input, width=3, style = {'align-self': 'center'}),
             dbc.Col(export_progress, style = {'align-self': 'center'})
         ]),
         dbc.Row(
             html.Div(id='export_msg', className = 'pb-3', style={'textAlign': 'center'})
+        , class_name = 'px-3'),
+        dbc.Row(
+            html.Div(dbc.Button(
+                "CANCEL",
+                id="cancel_jobs",
+                n_clicks=0,
+                color='secondary',
+                size='sm'
+            ), className = 'pb-3')
         , class_name = 'px-3')
     ])
 
@@ -364,6 +376,9 @@ def prepare_layout():
 
 def serve_layout():
     return dbc.Container([ # Fluid Container
+        dcc.Store(id='session_id', data=uuid.uuid4().hex), # identifies the page's background jobs
+        dcc.Store(id='data_version', data=config.data['all_data_version']), # all_data version shown on the page
+        dcc.Interval(id='live_interval', interval=max(config.live_interval, 1) * 1000, disabled=config.live_interval == 0),
         html.Div([ #Padding & alignment div
             #HEADER
             dbc.Row([
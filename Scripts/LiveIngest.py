@@ -0,0 +1,91 @@
+# Import packages
+import time
+import shutil
+import threading
+import traceback
+from datetime import datetime
+import pandas as pd
+from pytz import timezone
+
+import Scripts.config as config
+import Scripts.ProcessData_resampler as ProcessData
+import Scripts.ImportManifest as ImportManifest
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+import Scripts.Pyramid as Pyramid
+import Scripts.Compact as Compact
+
+# Live ingest of new data files while the app is running (--live SECONDS)
+# A background thread checks the data folders of the selected datasets every config.live_interval seconds.
+# When a file is new or changed (size or modification time against the import manifest) the new files are
+# imported as in refresh mode, merged into all_data from the earliest new DateTime onwards, the store and the
+# resampled levels (built beside the levels in use) are updated from that month, and the new levels and all_data
+# are swapped in under the DataAccess write lock. Swapping all_data bumps its version, which clears the chart
+# cache and extends the page's date slider.
+
+thread = None
+
+def start():
+    global thread
+    if config.shared:
+        print("Live ingest is not run in server mode (wsgi.py): refresh the data with app.py --update --refresh")
+        return
+    ProcessData.setIOFolder(config.io_dir) # CustomDataImports
+    ProcessData.selectDatasets()
+    ImportManifest.loadManifest()
+    thread = threading.Thread(target=poll, name="live_ingest", daemon=True)
+    thread.start()
+    print("Checking for new data every " + str(config.live_interval) + " seconds")
+
+def poll():
+    while True:
+        time.sleep(config.live_interval)
+        try:
+            ingest()
+        except Exception:
+            print("Live ingest failed:")
+            traceback.print_exc()
+
+def filesChanged():
+    # Whether any data file of the selected datasets is new or changed
+    for dataset in config.importer['selected_datasets']:
+        for folder in range(1, len(config.config['info']['datasets'].query('dataset == "' + dataset + '"')) + 1):
+            data_folder_path, filenames = ProcessData.dataFiles(dataset, folder)
+            if any(ImportManifest.fileChanged(data_folder_path / filename) for filename in filenames):
+                return True
+    return False
+
+def mergeNewData(new_start):
+    # all_data with the imported dataset_data merged in, only reprocessing the rows from new_start onwards
+    current = config.data['all_data']
+    split = current['DateTime'].searchsorted(new_start)
+    tail = ProcessData.processAllData(Compact.floatFrame(current.iloc[split:]))
+    df = pd.concat([Compact.floatFrame(current.iloc[:split]), tail], axis=0, ignore_index=True)
+    return df.loc[:, ProcessData.sortColumns(df.columns)]
+
+def ingest():
+    # Import any new or changed files into all_data, returning whether all_data was updated
+    if not filesChanged():
+        return False
+    if not config.config.get('date_end_fixed', False): # data up to now, as when processing
+        config.config['date_end'] = datetime.now(timezone('UTC')).replace(microsecond=0)
+    config.data['dataset_data'] = {}
+    ProcessData.importDatasets()
+    new_start = ProcessData.updateStart()
+    if new_start is None: # changed files without new rows in the date range
+        ImportManifest.saveManifest()
+        return False
+
+    all_data = mergeNewData(new_start)
+    print("Updating all_data (" + config.store_format + ") in Output from " + str(new_start))
+    DataStore.saveAllData(all_data, since=new_start)
+    ImportManifest.saveManifest()
+    stage = Pyramid.stagePyramid(since=new_start)
+    with DataAccess.lock.writing(): # no chart reads the levels or all_data while they are swapped
+        replaced = Pyramid.swapPyramid(stage)
+        DataAccess.setAllData(all_data)
+    shutil.rmtree(replaced, ignore_errors=True)
+    config.data['dataset_data'] = {}
+    ProcessData.export15Min(config.io_dir / 'Output' / 'all_data_15Min')
+    print("Live data updated to " + str(DataAccess.dateExtent()[1]) + " (version " + str(config.data['all_data_version']) + ")")
+    return True
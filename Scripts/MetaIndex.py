@@ -0,0 +1,105 @@
+# Import packages
+from types import MappingProxyType
+
+import pandas as pd
+
+import Scripts.config as config
+
+# Read only index of the plot and parameter info used to build the charts
+# Built once from config.config['plot_pars'] and the plots info sheet, so the chart code looks up
+# parameter attributes in dicts instead of running DataFrame.query for every trace of every request.
+# The index is rebuilt when plot_pars is replaced (e.g. config reloaded).
+
+PARAMETER_FIELDS = ('parameter', 'parameter_lab', 'plot', 'line', 'ribbon', 'bar', 'point',
+                    'colour', 'fill', 'shape', 'dash', 'bar_order', 'show_in_legend')
+PLOT_FIELDS = ('ylab', 'ymin', 'ymax', 'log')
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(type(self).__name__ + " is read only")
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(name + "=" + repr(getattr(self, name)) for name in self.__slots__) + ")"
+
+class ParameterInfo(Record):
+    # One plot_pars row, values as in the info file (e.g. point/ribbon/bar may be NaN)
+    __slots__ = PARAMETER_FIELDS
+
+class PlotInfo(Record):
+    __slots__ = ('plot',) + PLOT_FIELDS + (
+        'parameters', # tuple of the plot's ParameterInfo in plot_pars order
+        'labels', # trace label: ParameterInfo of its parameter
+        'has_point', # any point value set
+        'has_bar', # any bar value set
+        'bar_ticks', # any bar value True
+        'bar_labels') # bar_order: trace label
+
+    def selected(self, trace_names = None):
+        # Parameters of the selected trace labels (all if None), in plot_pars order
+        if trace_names is None:
+            return list(self.parameters)
+        return [par_info for par_info in self.parameters if par_info.parameter_lab in trace_names]
+
+    def parCodes(self, trace_names = None):
+        return list(dict.fromkeys(par_info.parameter for par_info in self.selected(trace_names)))
+
+    def barOrders(self, trace_names):
+        # Position of each selected bar counted up from the bottom of the plot
+        bars = pd.unique(pd.Series([par_info.bar_order for par_info in self.selected(trace_names)], dtype=object))
+        bar_orders = {}
+        for b in range(0, len(bars), 1):
+            bar_orders[bars[b]] = len(bars) - 1 - b
+        return bar_orders
+
+class Index(Record):
+    __slots__ = ('source', 'parameters', 'plots')
+
+index = None
+
+def buildIndex():
+    plot_pars = config.config['plot_pars']
+    plots_info = config.config['info']['plots']
+    parameters = {}
+    plot_parameters = {}
+    for row in plot_pars[list(PARAMETER_FIELDS)].to_dict('records'):
+        par_info = ParameterInfo(**row)
+        parameters.setdefault(par_info.parameter, par_info)
+        plot_parameters.setdefault(par_info.plot, []).append(par_info)
+
+    plot_rows = {}
+    for plot, row in zip(plots_info.index, plots_info[list(PLOT_FIELDS)].to_dict('records')):
+        plot_rows.setdefault(plot, row)
+
+    plots = {}
+    for plot, plot_pars_list in plot_parameters.items():
+        labels = {}
+        for par_info in plot_pars_list:
+            labels.setdefault(par_info.parameter_lab, parameters[par_info.parameter])
+        plots[plot] = PlotInfo(plot = plot,
+                               parameters = tuple(plot_pars_list),
+                               labels = MappingProxyType(labels),
+                               has_point = any(par_info.point for par_info in plot_pars_list),
+                               has_bar = any(par_info.bar for par_info in plot_pars_list),
+                               bar_ticks = any(par_info.bar == True for par_info in plot_pars_list),
+                               bar_labels = MappingProxyType({par_info.bar_order: par_info.parameter_lab for par_info in plot_pars_list}),
+                               **plot_rows[plot])
+    return Index(source = plot_pars, parameters = MappingProxyType(parameters), plots = MappingProxyType(plots))
+
+def getIndex():
+    global index
+    if index is None or index.source is not config.config['plot_pars']:
+        index = buildIndex()
+    return index
+
+def plotInfo(plot):
+    return getIndex().plots[plot]
+
+def parameterInfo(par):
+    # None if the parameter is not plotted
+    return getIndex().parameters.get(par)
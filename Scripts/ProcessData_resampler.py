@@ -13,15 +13,22 @@ import pickle
 import bz2
 import shutil
 import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import Scripts.config as config
+import Scripts.DataStore as DataStore
+import Scripts.DataExport as DataExport
+import Scripts.DateTimes as DateTimes
+import Scripts.ImportManifest as ImportManifest
+import Scripts.Pyramid as Pyramid
 
 def helper():
     print("Help")
 
 def processArguments():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "dp:uve", ["io_dir=", "port=", "update"])
+        opts, args = getopt.getopt(sys.argv[1:], "dp:uvrej:b:", ["io_dir=", "port=", "update", "refresh", "store=", "jobs=", "batch=", "compact", "live="])
     except getopt.GetoptError as err:
         # print help information and exit:
         print(str(err))  # will print something like "option -a not recognized"
@@ -38,6 +45,18 @@ def processArguments():
             config.port = int(arg)
         elif opt in ("-u", "--update"):
             config.update = True
+        elif opt in ("-r", "--refresh"):
+            config.refresh = True
+        elif opt == "--store":
+            config.store_format = arg
+        elif opt in ("-j", "--jobs"):
+            config.workers = int(arg)
+        elif opt in ("-b", "--batch"):
+            config.batch_files = int(arg)
+        elif opt == "--compact":
+            config.compact = True
+        elif opt == "--live":
+            config.live_interval = int(arg)
         else:
             assert False, "unhandled option"
 
@@ -75,16 +94,14 @@ def checkFolderExists(folder):
         return(True)
 
 def getConfig():
-    pfile_path = config.io_dir / "Temp" / 'config.pkl'
-    if os.path.exists(pfile_path):
-        with open(pfile_path, 'rb') as pfile:
-            items = pickle.load(pfile)
-        for key in list(items.keys()):
-            config.config[key] = items[key]
+    openinfoFile()
+    if DataStore.dataExists():
+        if config.batch_files == 0: # streamed updates read the store a month at a time
+            print("Importing processed data to update...")
+            config.data['all_data'] = DataStore.loadAllData()
     else:
-        print("No pickled config.pkl data file exists, continuing with full data import!")
+        print("No processed all_data store exists, continuing with full data import!")
         config.update = False
-        openinfoFile()
 
 def saveObject(object_to_save, filepath):
     with bz2.BZ2File(filepath, 'wb') as f:
@@ -97,17 +114,9 @@ def setUTCDatetime(date_str, old_tz, dt_format = "%d/%m/%Y %H:%M:%S"):
         return pd.NaT
     else:
         if dt_format not in date_formats: date_formats.append(dt_format)
-        for format in date_formats:
-            try:
-                datetime_set_naive = datetime.strptime(date_str, format)
-                break
-            except ValueError:
-                continue
-        try:
-            datetime_set_old = timezone(old_tz).localize(datetime_set_naive)
-            datetime_set_utc = datetime_set_old.astimezone(timezone('UTC'))
-        except UnboundLocalError:
-            raise ValueError("Set dt_format in function call or date_formats")
+        datetime_set_naive = datetime.strptime(date_str, DateTimes.detectFormat(date_str, date_formats))
+        datetime_set_old = timezone(old_tz).localize(datetime_set_naive)
+        datetime_set_utc = datetime_set_old.astimezone(timezone('UTC'))
         return datetime_set_utc
 
 def processSetup(df):
@@ -120,7 +129,8 @@ def processSetup(df):
         raise ValueError("Set dt_format in function call or date_formats")
 
     #Process end date
-    if not pd.isna(df.loc['date_end_utc', 'value']):
+    config.config['date_end_fixed'] = not pd.isna(df.loc['date_end_utc', 'value'])
+    if config.config['date_end_fixed']:
         config.config['date_end'] = setUTCDatetime(str(df.loc['date_end_utc', 'value']), "UTC", "%Y-%m-%d %H:%M:%S")
     else:
         config.config['date_end'] = datetime.now(timezone('UTC')).replace(microsecond=0)
@@ -182,6 +192,7 @@ def processSizes(df):
 def openinfoFile():
     info_fname = "Info2.xlsx"
     config.config['info'] = pd.read_excel(config.io_dir / info_fname, sheet_name=None, index_col=0)
+    read_options.clear()
     config.config['info']['setup'] = processSetup(config.config['info']['setup'])
     config.config['info']['charts'] = processCharts(config.config['info']['charts'])
     config.config['info']['plots'] = processPlots(config.config['info']['plots'])
@@ -208,6 +219,46 @@ def selectDatasets():
     selected_pars_all_inc = pd.concat([selected_pars_inc, selected_pars_ave_inc])
 
     config.importer['selected_datasets'] = list(selected_pars_all_inc[selected_pars_all_inc].index.unique().values)
+    repGroupMap()
+
+def selectedCodes(dataset):
+    # Data file column codes of the dataset's selected parameters
+    parameters = config.config['info']['parameters'].query('dataset == "' + dataset + '"')
+    return list(dict.fromkeys(parameters[parameters['parameter'].isin(config.config['selected_pars'])]['code']))
+
+read_options = {} # dict of (dataset, folder, file type): read options, cleared when the info file is read
+
+def readOptions(dataset, folder, file_type = 'csv'):
+    # pd.read_csv (or pd.read_excel) keyword arguments from the optional dtype, usecols and engine columns of the datasets sheet
+    # dtype: type of the parameter columns (e.g. float32), usecols: comma separated other columns to read (e.g. Date, Time)
+    # with the selected parameter columns, engine: csv parser (c, python or pyarrow)
+    key = (dataset, folder, file_type)
+    if key not in read_options:
+        read_options[key] = datasetReadOptions(dataset, folder, file_type)
+    return dict(read_options[key])
+
+def datasetReadOptions(dataset, folder, file_type):
+    info = config.config['info']['datasets'].query('dataset == "' + dataset + '" & folder == ' + str(folder))
+    setting = lambda column: info[column][dataset] if column in info.columns and not pd.isna(info[column][dataset]) else None
+    options = {}
+    codes = selectedCodes(dataset)
+    engine = None if setting('engine') is None else str(setting('engine')).strip()
+    if setting('dtype') is not None:
+        try:
+            dtype = np.dtype(str(setting('dtype')).strip())
+        except TypeError:
+            raise ValueError("Unknown dtype for " + str(dataset) + " folder " + str(folder) + ": " + str(setting('dtype')))
+        options['dtype'] = {code: dtype for code in codes}
+    if setting('usecols') is not None:
+        wanted = [col.strip() for col in str(setting('usecols')).split(',') if col.strip() != ''] + codes
+        if engine == 'pyarrow' and file_type == 'csv':
+            options['usecols'] = wanted # pyarrow needs a list, so every column must be in each file
+        else:
+            wanted = set(wanted)
+            options['usecols'] = lambda col: col in wanted
+    if engine is not None and file_type == 'csv':
+        options['engine'] = engine
+    return options
 
 def readFile(dataset, folder, filename):
     file_pat = config.config['info']['datasets'].query('dataset == "' + dataset + '" & folder == ' + str(folder))['file_pat'][dataset]
@@ -237,36 +288,206 @@ def readFile(dataset, folder, filename):
         #Choose parameters included in parameters sheet
         #config.config['selected_pars'] = list(config.config['info']['parameters'].query('dataset == "' + dataset + '"')['parameter'].values)
         df = df.drop(df.columns.difference(['DateTime'] + config.config['selected_pars']), axis=1)
-        #Make floats
-        for col in config.config['selected_pars']:
-            try:
-                df.loc[:,col] = df.loc[:,col].astype(float)
-            except:
-                pass
+        #Make floats (columns read as float32 or float64 are kept)
+        for col in df.columns.intersection(config.config['selected_pars']):
+            if df[col].dtype.kind != 'f':
+                try:
+                    df[col] = df[col].astype(float)
+                except (ValueError, TypeError):
+                    pass
         # Add blank row between files - to be implemented
     return df
 
-def importFiles(dataset, folder):
+def dataFiles(dataset, folder):
+    # Data folder path and the names of the data files in it in filename order
     data_folder_path = Path(config.config['info']['datasets'].query('dataset == "' + dataset + '" & folder == ' + str(folder))['data_folder_path'][dataset])
     file_pat = config.config['info']['datasets'].query('dataset == "' + dataset + '" & folder == ' + str(folder))['file_pat'][dataset]
-    files_imported = config.importer['files_imported'][dataset][folder]
-    dataset_in_folder = []
-    pbar = tqdm(os.listdir(data_folder_path))
-    for filename in pbar:
-        pbar.set_description("Open files to import: %s" % dataset)
-        if re.search(file_pat, filename) and not filename.startswith('.'):
-            if filename not in files_imported:
-                df = readFile(dataset, folder, filename)
-                # Keep if longer than 0 lines and within timeframe
-                if len(df) > 0 and max(df['DateTime']) >= config.config['date_start'] and min(df['DateTime']) <= config.config['date_end']:
-                    dataset_in_folder.append(df)
-                    files_imported.append(filename)
+    filenames = [filename for filename in sorted(os.listdir(data_folder_path)) if re.search(file_pat, filename) and not filename.startswith('.')]
+    return data_folder_path, filenames
+
+def listFiles(dataset, folder):
+    # New or changed data files to import in filename order
+    data_folder_path, filenames = dataFiles(dataset, folder)
+    files = []
+    for filename in filenames:
+        file_record = ImportManifest.checkFile(dataset, folder, data_folder_path / filename)
+        if file_record is not None:
+            files.append((filename, file_record))
+    return files
+
+def reimportFiles(folder_files):
+    # A changed file that was imported before replaces the rows of its previous DateTime range (its manifest record).
+    # The rows of every dataset in that range are dropped from the stored all_data (dropReimportedRows) and rebuilt,
+    # so the other files overlapping the range are read again, keeping only their rows in it (clipRows)
+    windows = []
+    for files in folder_files.values():
+        for filename, file_record, windows_only in files:
+            previous = config.importer['manifest'].get(file_record['path'])
+            if previous is not None and 'first' in previous:
+                windows.append((pd.Timestamp(previous['first']), pd.Timestamp(previous['last'])))
+    config.importer['reimport_windows'] = windows
+    if len(windows) == 0:
+        return
+    changed = set(file_record['path'] for files in folder_files.values() for filename, file_record, windows_only in files)
+    for (dataset, folder), files in folder_files.items():
+        data_folder_path, filenames = dataFiles(dataset, folder)
+        for filename in filenames:
+            record = config.importer['manifest'].get(str((data_folder_path / filename).resolve()))
+            if record is None or record['path'] in changed or 'first' not in record:
+                continue
+            overlaps = [(first, last) for first, last in windows if pd.Timestamp(record['first']) <= last and pd.Timestamp(record['last']) >= first]
+            if len(overlaps) > 0:
+                files.append((filename, record, overlaps))
+        files.sort(key=lambda file: file[0])
+
+def clipRows(df, windows):
+    # Rows of df in any of the (first, last) DateTime windows
+    keep = np.zeros(len(df), dtype=bool)
+    for first, last in windows:
+        keep |= ((df['DateTime'] >= first) & (df['DateTime'] <= last)).to_numpy()
+    return df[keep]
+
+def importedFile(file_record, windows_only, df):
+    # Record a newly read file in the manifest, or clip a file read again for a changed file's DateTime range
+    if windows_only is None:
+        ImportManifest.recordFile(file_record, df)
+        return df
+    return clipRows(df, windows_only)
+
+def inTimeframe(df):
+    # Keep if longer than 0 lines and within timeframe
+    return len(df) > 0 and df['DateTime'].max() >= config.config['date_start'] and df['DateTime'].min() <= config.config['date_end']
+
+def combineFiles(dataset_in_folder):
     if (not all(df is None for df in dataset_in_folder)) and (len(dataset_in_folder) > 0):
         df_combined = pd.concat(dataset_in_folder, axis=0, ignore_index=True)
         return df_combined
-    #else:
-    #    df_combined = None
-    
+
+def importFiles(dataset, folder, files):
+    dataset_in_folder = []
+    pbar = tqdm(files)
+    for filename, file_record, windows_only in pbar:
+        pbar.set_description("Open files to import: %s" % dataset)
+        df = importedFile(file_record, windows_only, readFile(dataset, folder, filename))
+        if inTimeframe(df):
+            dataset_in_folder.append(df)
+    return combineFiles(dataset_in_folder)
+
+# Parallel import functions
+def initImportWorker(io_dir, info, selected_pars, supporting_data):
+    config.io_dir = io_dir
+    config.config['info'] = info
+    read_options.clear()
+    config.config['selected_pars'] = selected_pars
+    config.importer['supporting_data'] = supporting_data
+    setIOFolder(io_dir)
+
+def readFileTask(dataset, folder, filename):
+    # Read one file in a worker process, returning any error instead of raising
+    if (dataset, folder) in config.importer['supporting_data']:
+        config.data['supporting_data_dict'][dataset] = config.importer['supporting_data'][(dataset, folder)]
+    try:
+        return readFile(dataset, folder, filename), None
+    except Exception as e:
+        return None, repr(e)
+
+def folderFiles():
+    # New or changed files of every selected dataset folder (filename, manifest record, None) and the files
+    # read again for the DateTime ranges of changed files (filename, manifest record, ranges), with any supporting data
+    folder_files = {}
+    supporting_data = {}
+    for dataset in config.importer['selected_datasets']:
+        num_folders = len(config.config['info']['datasets'].query('dataset == "' + dataset + '"'))
+        for folder in range(1, num_folders + 1):
+            if dataset in CustomDataImports.preimport_functions:
+                supporting_data[(dataset, folder)] = CustomDataImports.preimport_functions[dataset](dataset, folder)
+            folder_files[(dataset, folder)] = [(filename, file_record, None) for filename, file_record in listFiles(dataset, folder)]
+    reimportFiles(folder_files)
+    return folder_files, supporting_data
+
+def importDatasetsParallel():
+    # Read the files of every dataset folder concurrently with a pool of config.workers processes
+    folder_files, supporting_data = folderFiles()
+
+    pbars = {}
+    for dataset in config.importer['selected_datasets']:
+        total = sum(len(files) for (d, folder), files in folder_files.items() if d == dataset)
+        pbars[dataset] = tqdm(total=total, desc="Open files to import: %s" % dataset, position=len(pbars))
+
+    config.importer['import_errors'] = []
+    with ProcessPoolExecutor(max_workers=config.workers, initializer=initImportWorker,
+                             initargs=(config.io_dir, config.config['info'], config.config['selected_pars'], supporting_data)) as pool:
+        futures = {}
+        for (dataset, folder), files in folder_files.items():
+            for filename, file_record, windows_only in files:
+                futures[pool.submit(readFileTask, dataset, folder, filename)] = (dataset, folder, filename, file_record, windows_only)
+        results = {}
+        for future in as_completed(futures):
+            dataset, folder, filename, file_record, windows_only = futures[future]
+            df, error = future.result()
+            if error is None:
+                results[(dataset, folder, filename)] = importedFile(file_record, windows_only, df)
+            else:
+                config.importer['import_errors'].append({'dataset': dataset, 'folder': folder, 'file': filename, 'error': error})
+            pbars[dataset].update()
+    for pbar in pbars.values():
+        pbar.close()
+
+    # Combine in dataset, folder and filename order
+    for dataset in config.importer['selected_datasets']:
+        folder_data_list = {}
+        for (d, folder), files in folder_files.items():
+            if d == dataset:
+                dataset_in_folder = [results[(dataset, folder, filename)] for filename, file_record, windows_only in files
+                                     if (dataset, folder, filename) in results and inTimeframe(results[(dataset, folder, filename)])]
+                folder_data_list[folder] = combineFiles(dataset_in_folder)
+        df = combineSortData(folder_data_list)
+        if df is not None:
+            config.data['dataset_data'][dataset] = df
+
+    printImportErrors()
+
+def printImportErrors():
+    for error in config.importer['import_errors']:
+        print("Failed to import " + error['dataset'] + " folder " + str(error['folder']) + " file " + error['file'] + ": " + error['error'])
+
+def iterFileData(folder_files, supporting_data):
+    # Yield (dataset, folder, df) for each imported file in dataset, folder and filename order
+    # When reading in parallel at most config.workers * 2 files are held in flight
+    tasks = [(dataset, folder, filename, file_record, windows_only) for (dataset, folder), files in folder_files.items()
+             for filename, file_record, windows_only in files]
+
+    def results():
+        if config.workers > 1:
+            with ProcessPoolExecutor(max_workers=config.workers, initializer=initImportWorker,
+                                     initargs=(config.io_dir, config.config['info'], config.config['selected_pars'], supporting_data)) as pool:
+                pending = deque()
+                for task in tasks:
+                    pending.append((task, pool.submit(readFileTask, *task[:3])))
+                    if len(pending) >= config.workers * 2:
+                        task, future = pending.popleft()
+                        yield task, future.result()
+                while len(pending) > 0:
+                    task, future = pending.popleft()
+                    yield task, future.result()
+        else:
+            for task in tasks:
+                if (task[0], task[1]) in supporting_data:
+                    config.data['supporting_data_dict'][task[0]] = supporting_data[(task[0], task[1])]
+                yield task, (readFile(*task[:3]), None)
+
+    config.importer['import_errors'] = []
+    pbar = tqdm(total=len(tasks), desc="Open files to import")
+    for (dataset, folder, filename, file_record, windows_only), (df, error) in results():
+        pbar.update()
+        if error is not None:
+            config.importer['import_errors'].append({'dataset': dataset, 'folder': folder, 'file': filename, 'error': error})
+            continue
+        df = importedFile(file_record, windows_only, df)
+        if inTimeframe(df):
+            yield dataset, folder, df
+    pbar.close()
+    printImportErrors()
 
 def combineSortData(df_dict):
     # Create one dataframe from all days data
@@ -274,7 +495,7 @@ def combineSortData(df_dict):
 
     if len(df_dict_filtered) > 0:
         df = pd.concat(df_dict_filtered, axis=0, ignore_index=True)
-        df.sort_values(by=['DateTime'], inplace=True)
+        df.sort_values(by=['DateTime'], inplace=True, kind='mergesort')
         cols = ['DateTime']  + [col for col in df if col != 'DateTime']
         df = df[cols]
         df = df.reset_index(drop=True)
@@ -286,60 +507,104 @@ def combineSortData(df_dict):
         print('No data to combine!')
     
 
-def importData(dataset):
+def importData(dataset, folder_files, supporting_data):
     num_folders = len(config.config['info']['datasets'].query('dataset == "' + dataset + '"'))
     folder_data_list = {}
-    if dataset not in config.importer['files_imported']:
-        config.importer['files_imported'][dataset] = {}
     for folder in range(1, num_folders + 1):
-        if folder not in config.importer['files_imported'][dataset]:
-            config.importer['files_imported'][dataset][folder] = []
         # Custom pre-import functions
-        if dataset in CustomDataImports.preimport_functions:
-            config.data['supporting_data_dict'][dataset] = CustomDataImports.preimport_functions[dataset](dataset, folder)
+        if (dataset, folder) in supporting_data:
+            config.data['supporting_data_dict'][dataset] = supporting_data[(dataset, folder)]
         # Import files
-        folder_data_list[folder] = importFiles(dataset, folder)
+        folder_data_list[folder] = importFiles(dataset, folder, folder_files[(dataset, folder)])
     if (not any(df is None for df in folder_data_list)) & (len(folder_data_list) > 0):
         df_dataset = combineSortData(folder_data_list)
         return df_dataset
 
 def importDatasets():
     selectDatasets()
+    config.data['dataset_data'] = {} # only the files of this run, main can run again in the same process
+    if config.workers > 1:
+        importDatasetsParallel()
+        return
+    folder_files, supporting_data = folderFiles()
     for dataset in tqdm(config.importer['selected_datasets'], desc = "Import data from each dataset"):
-        df = importData(dataset)
+        df = importData(dataset, folder_files, supporting_data)
         if df is not None:
             config.data['dataset_data'][dataset] = df
 
+def repGroupMap():
+    # Map each parameter to its parameter_ave and each parameter_ave to its replicates (parameters sheet order)
+    par_ave = {}
+    members = {}
+    for par, ave_par in zip(config.config['info']['parameters']['parameter'], config.config['info']['parameters']['parameter_ave']):
+        par_ave.setdefault(par, ave_par)
+        members.setdefault(ave_par, []).append(par)
+    config.importer['rep_groups'] = {'parameter_ave': par_ave, 'members': members}
+
 def averageReps(df):
+    # Mean and error of every replicate group. Groups with the same number of replicates are
+    # stacked into one (rows, groups, replicates) array and reduced together along the last axis
+    if df is None:
+        return
+    if len(config.importer['rep_groups']) == 0:
+        repGroupMap()
+    groups = {}
+    for col in df.columns[1:]:
+        ave_col = config.importer['rep_groups']['parameter_ave'].get(col, col)
+        if ave_col != col and ave_col not in groups:
+            groups[ave_col] = [par for par in config.importer['rep_groups']['members'][ave_col] if par in df.columns]
+
+    ave_data = {}
     with warnings.catch_warnings():
         warnings.filterwarnings('ignore', r'All-NaN (slice|axis) encountered')
         warnings.filterwarnings('ignore', r'Degrees of freedom <= 0 for slice.')
-        ave_cols = []
-        if df is not None:
-            for col in tqdm(df.columns[1:].to_list(), desc="Averaging data"):
-                ave_col = config.config['info']['parameters'].query('parameter == "' + col + '"')['parameter_ave'][0]
-                if ave_col != col:
-                    if ave_col not in ave_cols:
-                        cols = config.config['info']['parameters'].query('parameter_ave == "' + ave_col + '"')['parameter'].to_list()
-                        cols = [col for col in cols if col in df.columns]
-                        df[ave_col] = df[cols].mean(axis=1)
-                        if len(cols) > 2:
-                            df[ave_col + "_err"] = np.nanstd(df[cols], axis=1)
-                        elif len(cols) == 2:
-                            df[ave_col + "_err"] = np.abs((df[cols[0]] - df[cols[1]])/2)
-                        else:
-                            df[ave_col + "_err"] = 0
-                        ave_cols.append(ave_col)
-
-            err_pars = [ave_col + "_err" for ave_col in ave_cols]
-            chosen_pars = config.config['selected_pars'] + err_pars
-            chosen_pars = [par for par in chosen_pars if par in df.columns]
-
-            df = df[["DateTime"]+ chosen_pars]
-            return df
-
-def processAllData():
+        warnings.filterwarnings('ignore', r'Mean of empty slice')
+        for size in sorted(set(len(cols) for cols in groups.values())):
+            size_groups = [ave_col for ave_col in groups if len(groups[ave_col]) == size]
+            values = df[[par for ave_col in size_groups for par in groups[ave_col]]].to_numpy(dtype=float)
+            values = values.reshape(len(df), len(size_groups), size)
+            means = np.nanmean(values, axis=2)
+            if size > 2:
+                errs = np.nanstd(values, axis=2)
+            elif size == 2:
+                errs = np.abs((values[:, :, 0] - values[:, :, 1])/2)
+            else:
+                errs = np.zeros((len(df), len(size_groups)), dtype=np.int64)
+            for i, ave_col in enumerate(size_groups):
+                ave_data[ave_col] = means[:, i]
+                ave_data[ave_col + "_err"] = errs[:, i]
+
+    err_pars = [ave_col + "_err" for ave_col in groups]
+    chosen_pars = config.config['selected_pars'] + err_pars
+    kept_pars = [par for par in chosen_pars if par in df.columns and par not in ave_data]
+    ave_pars = [par for par in chosen_pars if par in ave_data]
+    df = pd.concat([df[["DateTime"] + kept_pars], pd.DataFrame({par: ave_data[par] for par in ave_pars}, index=df.index)], axis=1)
+    return df
+
+def dropReimportedRows(df):
+    # Remove the rows of the DateTime ranges rebuilt from files read again (reimportFiles) from DateTime sorted df
+    if df is None or len(config.importer['reimport_windows']) == 0:
+        return df
+    drop = np.zeros(len(df), dtype=bool)
+    for first, last in config.importer['reimport_windows']:
+        drop[df['DateTime'].searchsorted(first, side='left'):df['DateTime'].searchsorted(last, side='right')] = True
+    if drop.any():
+        df = df[~drop].reset_index(drop=True)
+    return df
+
+def sortColumns(columns):
+    cols = sorted(columns)
+    cols.insert(0, cols.pop(cols.index('DateTime')))
+    return cols
+
+def processAllData(previous = None):
+    # all_data from the imported dataset_data, merged into previous (default all_data) if updating
+    if previous is None:
+        previous = config.data['all_data']
     df = combineSortData(config.data['dataset_data'])
+    if df is None and config.update:
+        print("No new or changed files to import")
+        return dropReimportedRows(previous)
 
     if "mod_post_import_data" in dir(CustomDataImports):
         df = CustomDataImports.mod_post_import_data(df)
@@ -347,19 +612,151 @@ def processAllData():
     df = averageReps(df)
 
     if config.update:
-        all_dict = {'all': config.data['all_data'], 'new': df}
+        all_dict = {'all': dropReimportedRows(previous), 'new': df}
         df = combineSortData(all_dict)
 
     #Sort columns
-    df = df.reindex(sorted(df.columns), axis=1)
-    cols = list(df)
-    cols.insert(0, cols.pop(cols.index('DateTime')))
-    df = df.loc[:, cols]
+    df = df.loc[:, sortColumns(df.columns)]
 
     df.dropna(how='all', axis=1, inplace=True)
 
     return df
 
+# Streaming import functions
+# Files are imported in batches of config.batch_files. Each DateTime sorted batch is spilled to
+# one run file per calendar month, so the runs can be merged and processed a month at a time
+# and all_data is written to the store without ever being held in memory whole.
+
+def spillDatasets(runs_folder):
+    # Import files in batches, spilling each batch to month split runs. Returns the earliest DateTime
+    folder_files, supporting_data = folderFiles()
+    batch = []
+    run = 0
+    new_start = None
+    def spill(batch, run):
+        df = combineSortData(dict(enumerate(batch)))
+        if df is not None and len(df) > 0:
+            DataStore.spillRun(df, runs_folder, run)
+            return df['DateTime'].iloc[0]
+    for dataset, folder, df in iterFileData(folder_files, supporting_data):
+        batch.append(df)
+        if len(batch) >= config.batch_files:
+            start = spill(batch, run)
+            new_start = start if new_start is None or (start is not None and start < new_start) else new_start
+            batch = []
+            run += 1
+    if len(batch) > 0:
+        start = spill(batch, run)
+        new_start = start if new_start is None or (start is not None and start < new_start) else new_start
+    return new_start
+
+def processMonths(runs_folder, processed_folder):
+    # Merge the runs of each month, apply post import modifications and averaging
+    # Returns the columns containing data
+    months = DataStore.runMonths(runs_folder)
+    run_columns = set()
+    for month in months:
+        for run in os.listdir(runs_folder / month):
+            run_columns.update(DataStore.runColumns(runs_folder / month / run))
+    run_columns = sortColumns(run_columns)
+
+    processed_folder.mkdir(parents=True, exist_ok=True)
+    filled = set()
+    carry = None
+    for month in tqdm(months, desc="Process data by month"):
+        df = DataStore.readRuns(runs_folder, month).reindex(columns=run_columns)
+        df.sort_values(by=['DateTime'], inplace=True, kind='mergesort')
+        df = df.reset_index(drop=True)
+
+        if "mod_post_import_data" in dir(CustomDataImports):
+            # Carry the last row of the previous month for modifications like forward filling
+            if carry is not None:
+                df = pd.concat([carry, df], axis=0, ignore_index=True)
+            df = CustomDataImports.mod_post_import_data(df)
+            if carry is not None:
+                df = df.iloc[1:].reset_index(drop=True)
+            carry = df.iloc[-1:]
+
+        df = averageReps(df)
+        filled.update(df.columns[df.notna().any().to_numpy()])
+        df.to_parquet(processed_folder / (month + ".parquet"), engine='pyarrow', compression='lz4', index=False)
+    return sortColumns(filled)
+
+def storeMonths(processed_folder, columns, new_start):
+    # Write processed months to the store, merging with stored months when updating
+    meta = DataStore.readMeta() if config.update else None
+    since = None
+    existing = []
+    if meta is not None:
+        if DataStore.canUpdate(columns):
+            since = new_start
+            since_key = new_start.year * 100 + new_start.month
+            existing = [key for key in meta['partitions'] if int(key) >= since_key]
+            columns = meta['columns']
+        else:
+            existing = list(meta['partitions'])
+            columns = sortColumns(set(meta['columns']) | set(columns))
+    processed = [filename.replace(".parquet", "") for filename in os.listdir(processed_folder)]
+
+    def chunks():
+        for month in sorted(set(existing) | set(processed)):
+            parts = []
+            if month in existing:
+                parts.append(dropReimportedRows(DataStore.readPartition(meta, month)))
+            if month in processed:
+                parts.append(pd.read_parquet(processed_folder / (month + ".parquet"), engine='pyarrow'))
+            df = pd.concat(parts, axis=0, ignore_index=True)
+            if len(parts) > 1:
+                df.sort_values(by=['DateTime'], inplace=True, kind='mergesort')
+            yield df.reindex(columns=columns)
+
+    DataStore.writeStream(chunks(), since=since, columns=columns)
+
+def streamAllData():
+    # Import, process and store all_data in bounded batches. Returns the earliest new DateTime
+    ingest_folder = config.io_dir / "Temp" / "Ingest"
+    deleteFolderContents(ingest_folder)
+    new_start = spillDatasets(ingest_folder / "runs")
+    if new_start is not None:
+        new_start = min([new_start] + [first for first, last in config.importer['reimport_windows']])
+    if new_start is None:
+        if config.update:
+            print("No new or changed files to import")
+        else:
+            print('No data to combine!')
+    else:
+        columns = processMonths(ingest_folder / "runs", ingest_folder / "processed")
+        if config.update:
+            print("Updating all_data (" + config.store_format + ") in Output")
+        else:
+            print("Exporting all_data (" + config.store_format + ") to Output")
+        storeMonths(ingest_folder / "processed", columns, new_start)
+    shutil.rmtree(ingest_folder)
+    return new_start
+
+def updateStart():
+    # Earliest DateTime of newly imported data or of the rows it replaces
+    starts = [df['DateTime'].min() for df in config.data['dataset_data'].values() if df is not None and len(df) > 0]
+    starts += [first for first, last in config.importer['reimport_windows']]
+    if len(starts) == 0:
+        return None
+    return min(starts)
+
+def export15Min(filepath):
+    # Write 15 minute means of all_data from the 15 minute level, including empty bins
+    def chunks():
+        last_bin = None
+        for df in DataStore.iterPartitions(folder=Pyramid.levelFolder(15)):
+            if len(df) == 0:
+                continue
+            pars = [col[:-len("|sum")] for col in df.columns if col.endswith("|sum")]
+            grouped = Pyramid.levelMeans(df, pars)
+            first_bin = grouped.index[0] if last_bin is None else last_bin + pd.Timedelta(minutes=15)
+            grouped = grouped.reindex(pd.date_range(first_bin, grouped.index[-1], freq='15Min', name='DateTime'))
+            last_bin = grouped.index[-1]
+            yield grouped.reset_index()
+    DataExport.writeChunks(chunks(), filepath, 'csv')
+
 #########
 
 def main():
@@ -368,20 +765,37 @@ def main():
     
     if not config.update: # Reimport all data
         openinfoFile()
-    else: # Update existing config file data
+    else: # Update existing all_data with new or changed files
         getConfig()
+    ImportManifest.loadManifest(reset = not config.update)
+
+    if config.batch_files > 0: # stream batches of files to the store
+        selectDatasets()
+        new_start = streamAllData()
+        if new_start is not None or not Pyramid.levelExists(15):
+            Pyramid.buildPyramid(since=new_start if config.update else None)
+        ImportManifest.saveManifest()
+        print("Exporting all_data_15Min.csv to Output")
+        export15Min(config.io_dir / 'Output' / 'all_data_15Min')
+        return
 
     importDatasets() # data dict per dataset
     
     config.data['all_data'] = processAllData() # all data combined and averaged
 
-    all_data_grouped = config.data['all_data'].set_index('DateTime').groupby(pd.Grouper(freq='15Min')).aggregate(np.mean)
-    print("Exporting all_data_15Min.csv to Output")
-    all_data_grouped.to_csv(config.io_dir / 'Output' / 'all_data_15Min.csv')
+    # Create partitioned storage of all_data
+    if not config.update:
+        print("Exporting all_data (" + config.store_format + ") to Output")
+        DataStore.saveAllData(config.data['all_data'])
+    elif updateStart() is not None:
+        print("Updating all_data (" + config.store_format + ") in Output")
+        DataStore.saveAllData(config.data['all_data'], since=updateStart())
+    if not config.update or updateStart() is not None or not Pyramid.levelExists(15):
+        Pyramid.buildPyramid(since=updateStart() if config.update else None)
+    ImportManifest.saveManifest()
 
-    # Create storage object with filename `processed_data`
-    print("Exporting all_data.pbz2 to Output")
-    saveObject(config.data['all_data'], (config.io_dir / 'Output' / 'all_data.pbz2'))
+    print("Exporting all_data_15Min.csv to Output")
+    export15Min(config.io_dir / 'Output' / 'all_data_15Min')
 
 if __name__ == "__main__":
     main()
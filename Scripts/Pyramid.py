@@ -0,0 +1,177 @@
+# Import packages
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from tqdm.autonotebook import tqdm
+
+import Scripts.config as config
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+
+# Pre-aggregated levels of all_data for resampled charts
+# Each level holds the sum, count, min and max of every parameter in fixed minute bins aligned to
+# midnight UTC, stored like all_data as monthly partitions in Output/pyramid/<level>Min.
+# Means of any coarser bin compose exactly from the sums and counts of the bins inside it.
+
+PYRAMID_LEVELS = [1, 5, 15, 60, 1440] # minutes, each dividing the next and a day
+stats = ['sum', 'count', 'min', 'max']
+MINUTE = 60 * 10**9 # ns
+
+def pyramidFolder():
+    return config.io_dir / "Output" / "pyramid"
+
+def levelFolder(level, root = None):
+    if root is None:
+        root = pyramidFolder()
+    return root / (str(level) + "Min")
+
+def statColumn(par, stat):
+    return par + "|" + stat
+
+def levelColumns(pars):
+    return ['DateTime'] + [statColumn(par, stat) for par in pars for stat in stats]
+
+def levelExists(level):
+    return DataStore.readMeta(levelFolder(level)) is not None
+
+def binStarts(bins):
+    # Positions where a sorted array of bin starts changes
+    return np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+
+def levelFrame(bins, pars, sums, counts, mins, maxs):
+    data = {'DateTime': pd.to_datetime(bins, utc=True)}
+    for i, par in enumerate(pars):
+        data[statColumn(par, 'sum')] = sums[:, i]
+        data[statColumn(par, 'count')] = counts[:, i]
+        data[statColumn(par, 'min')] = mins[:, i]
+        data[statColumn(par, 'max')] = maxs[:, i]
+    return pd.DataFrame(data)
+
+def aggregateRaw(df, level):
+    # Aggregate DateTime sorted all_data rows to level minute bins
+    pars = df.columns[1:].to_list()
+    epoch = pd.DatetimeIndex(df['DateTime']).asi8
+    bins = epoch - epoch % (level * MINUTE)
+    starts = binStarts(bins)
+    values = df.iloc[:, 1:].to_numpy(dtype=float)
+    notna = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        sums = np.add.reduceat(np.where(notna, values, 0), starts, axis=0)
+        counts = np.add.reduceat(notna, starts, axis=0).astype(np.int64)
+        mins = np.fmin.reduceat(values, starts, axis=0)
+        maxs = np.fmax.reduceat(values, starts, axis=0)
+    return levelFrame(bins[starts], pars, sums, counts, mins, maxs)
+
+def aggregateLevel(df, pars, bins):
+    # Combine the level bins of df into the (sorted) coarser bins given for each row
+    starts = binStarts(bins)
+    def stat(name):
+        return df[[statColumn(par, name) for par in pars]].to_numpy()
+    with np.errstate(invalid='ignore'):
+        sums = np.add.reduceat(stat('sum'), starts, axis=0)
+        counts = np.add.reduceat(stat('count'), starts, axis=0)
+        mins = np.fmin.reduceat(stat('min'), starts, axis=0)
+        maxs = np.fmax.reduceat(stat('max'), starts, axis=0)
+    return levelFrame(bins[starts], pars, sums, counts, mins, maxs)
+
+def coarsen(df, pars, level):
+    epoch = pd.DatetimeIndex(df['DateTime']).asi8
+    return aggregateLevel(df, pars, epoch - epoch % (level * MINUTE))
+
+def buildPyramid(since = None, root = None):
+    # Build every level from the all_data store, only rebuilding months from `since` if possible
+    # root: folder of the levels, default pyramidFolder()
+    all_meta = DataStore.readMeta()
+    if all_meta is None:
+        return
+    pars = all_meta['columns'][1:]
+    columns = levelColumns(pars)
+    previous = None
+    for level in tqdm(PYRAMID_LEVELS, desc="Building resampled levels"):
+        level_since = since
+        folder = levelFolder(level, root)
+        if since is not None and not (DataStore.canUpdate(columns, folder=folder) and DataStore.readMeta(folder)['columns'] == columns):
+            level_since = None
+        start = None if level_since is None else DataStore.monthStart(DataStore.utcTimestamp(level_since))
+        if previous is None:
+            chunks = (aggregateRaw(df, level) for df in DataStore.iterPartitions(start=start) if len(df) > 0)
+        else: # each level is built from the finer level before it (bins never span months)
+            chunks = (coarsen(df, pars, level) for df in DataStore.iterPartitions(start=start, folder=levelFolder(previous, root)) if len(df) > 0)
+        DataStore.writeStream(chunks, since=level_since, columns=columns, folder=folder)
+        previous = level
+
+def linkFile(source, destination):
+    # Hard link a level file (written files are always replaced, never changed in place), copying if links are not supported
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def stagePyramid(since = None):
+    # Build the levels updated from `since` beside the pyramid in use, in a linked copy of it, returning its folder
+    stage = pyramidFolder().with_name("pyramid_next")
+    if os.path.exists(stage):
+        shutil.rmtree(stage)
+    if os.path.exists(pyramidFolder()):
+        shutil.copytree(pyramidFolder(), stage, copy_function=linkFile)
+    buildPyramid(since, stage)
+    return stage
+
+def swapPyramid(stage):
+    # Put a staged pyramid in use (under the DataAccess write lock), returning the replaced folder to delete
+    replaced = pyramidFolder().with_name("pyramid_old")
+    if os.path.exists(replaced):
+        shutil.rmtree(replaced)
+    if os.path.exists(pyramidFolder()):
+        os.replace(pyramidFolder(), replaced)
+    os.replace(stage, pyramidFolder())
+    return replaced
+
+def levelFor(resample):
+    # Coarsest stored level whose bins divide the resample period
+    for level in reversed(PYRAMID_LEVELS):
+        if resample % level == 0 and levelExists(level):
+            return level
+    return None
+
+def levelMeans(df, pars):
+    # Mean of each parameter from a level dataframe
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = df[[statColumn(par, 'sum') for par in pars]].to_numpy() / df[[statColumn(par, 'count') for par in pars]].to_numpy()
+    return pd.DataFrame(means, columns=pars, index=pd.DatetimeIndex(df['DateTime'], name='DateTime'))
+
+def resampleRange(start, end, pars, resample, level):
+    # Mean of each parameter in resample minute bins over start < DateTime < end, as
+    # groupby(pd.Grouper(freq=...)).mean() of the raw rows (bins from midnight of the first row's day).
+    # Whole level bins inside the range are read from the level and the part bins at each end from the raw rows.
+    with DataAccess.lock.reading(): # all_data and the level files of one version
+        first, last = DataAccess.rangeBounds(start, end)
+        unique_pars = list(dict.fromkeys(pars))
+        epoch = DataAccess.epochIndex()
+        level_ns = level * MINUTE
+        resample_ns = int(resample) * MINUTE
+        start_ns = DataAccess.toEpoch(start)
+        end_ns = DataAccess.toEpoch(end)
+        origin = epoch[first] - epoch[first] % (1440 * MINUTE)
+        inner_start = (start_ns // level_ns + 1) * level_ns # first level bin starting after start
+        inner_end = max(inner_start, end_ns // level_ns * level_ns) # level bins must end by end
+
+        raw_columns = ['DateTime'] + unique_pars
+        inner_first = np.searchsorted(epoch, inner_start, side='left')
+        inner_last = np.searchsorted(epoch, inner_end, side='left')
+        edges = [(first, max(first, min(inner_first, last))), (min(max(inner_last, first), last), last)]
+        parts = []
+        if edges[0][1] > edges[0][0]:
+            parts.append(aggregateRaw(DataAccess.rows(edges[0][0], edges[0][1], raw_columns), level))
+        if inner_end > inner_start:
+            parts.extend(DataStore.iterPartitions(levelColumns(unique_pars), pd.to_datetime(inner_start, utc=True),
+                                                  pd.to_datetime(inner_end - 1, utc=True), levelFolder(level)))
+        if edges[1][1] > edges[1][0]:
+            parts.append(aggregateRaw(DataAccess.rows(edges[1][0], edges[1][1], raw_columns), level))
+        df = pd.concat([part for part in parts if len(part) > 0], axis=0, ignore_index=True)
+
+    bins = pd.DatetimeIndex(df['DateTime']).asi8
+    df = aggregateLevel(df, unique_pars, origin + (bins - origin) // resample_ns * resample_ns)
+    chart_data = levelMeans(df, unique_pars).dropna(thresh=1)
+    return chart_data[pars]
@@ -0,0 +1,67 @@
+# Import packages
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import plotly
+from kaleido.scopes.plotly import PlotlyScope
+
+import Scripts.config as config
+
+# Static image rendering of chart figures for the PNG and PDF exports
+# Each Kaleido scope runs its own chromium process and renders one figure at a time, so a pool of
+# up to config.render_workers scopes is kept running and figures are rendered concurrently,
+# each by whichever scope is free. Images are returned as bytes.
+
+plotlyjs = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+
+scopes = queue.Queue() # idle scopes
+scope_count = 0
+lock = threading.Lock()
+executor = None
+
+def getScope():
+    global scope_count
+    with lock:
+        if scopes.empty() and scope_count < config.render_workers:
+            scope_count += 1
+            try:
+                return PlotlyScope(plotlyjs=plotlyjs)
+            except Exception: # free the slot, else jobs could wait for a scope that never comes
+                scope_count -= 1
+                raise
+    return scopes.get()
+
+def getExecutor():
+    global executor
+    with lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=config.render_workers, thread_name_prefix="render")
+    return executor
+
+def renderImage(figure, otype, width, height, scale = 1):
+    # Image bytes of a figure (Figure or dict) at width x height layout pixels
+    scope = getScope()
+    try:
+        return scope.transform(figure, format=otype, width=width, height=height, scale=scale)
+    finally:
+        scopes.put(scope)
+
+def renderImages(figures, otype, width, heights, scale = 1, progress = None):
+    # Image bytes of each figure, rendered concurrently, calling progress(number done) as they finish
+    futures = [getExecutor().submit(renderImage, figure, otype, width, height, scale) for figure, height in zip(figures, heights)]
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if progress is not None:
+                progress(done)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return [future.result() for future in futures]
+
+def warmUp():
+    # Start every renderer so the first export does not wait for chromium to launch
+    renderImages([{'data': [], 'layout': {}}] * config.render_workers, 'png', 10, [10] * config.render_workers)
@@ -0,0 +1,107 @@
+# Import packages
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+
+import Scripts.config as config
+import Scripts.DataStore as DataStore
+import Scripts.Compact as Compact
+
+# all_data shared by the app's worker processes through a memory mapped file
+# all_data is written once to Output/shared/all_data.arrow as an uncompressed Arrow IPC file, with NaNs
+# kept as values so the float columns have no validity bitmaps (compacted first if config.compact).
+# Each process attaches to the file with a Handle, which maps it read only: the columns of all_data and
+# of any slice of it are views of the mapped pages instead of copies, so the OS holds one copy of the
+# data for all the processes. The file is rewritten when the store is saved again.
+
+attached = {} # dict of (file path, token): mapped pa.Table, one per process
+
+class Handle:
+    # Read only handle of the shared all_data file, small enough to pass to other processes
+    def __init__(self, filepath, token):
+        self.filepath = filepath
+        self.token = token
+
+    def __repr__(self):
+        return "Handle(" + str(self.filepath) + ", " + self.token + ")"
+
+    def table(self):
+        # Table of the mapped file, mapped once per process
+        key = (str(self.filepath), self.token)
+        if key not in attached:
+            attached.clear() # a replaced file stays mapped until its frames are released
+            with pa.memory_map(str(self.filepath), 'r') as source:
+                attached[key] = pa.ipc.open_file(source).read_all()
+        return attached[key]
+
+    def frame(self):
+        return toFrame(self.table())
+
+    def rows(self, first, last, columns = None):
+        # Rows first to last (columns of) all_data as views of the mapped file
+        table = self.table().slice(first, last - first)
+        if columns is not None:
+            table = table.select(list(columns))
+        df = toFrame(table)
+        df.index = pd.RangeIndex(first, first + len(df)) # as all_data.iloc[first:last]
+        return df
+
+def toFrame(table):
+    # Dataframe of an Arrow table, each column a block of its own so the numeric columns are not copied
+    return table.to_pandas(split_blocks=True)
+
+def sharedFile():
+    return config.io_dir / "Output" / "shared" / "all_data.arrow"
+
+def storeToken():
+    # Identifies the stored all_data (and compact mode with the compacted columns) the shared file was written from
+    meta = DataStore.readMeta()
+    if meta is not None:
+        token = meta['saved']
+    elif os.path.exists(DataStore.legacyFile()):
+        token = str(os.path.getmtime(DataStore.legacyFile()))
+    else:
+        return None
+    if config.compact: # the parameters sheets choose the compacted columns
+        types = json.dumps(sorted(Compact.declaredTypes().items()))
+        token += " compact " + hashlib.blake2b(types.encode(), digest_size=8).hexdigest()
+    return token
+
+def fileToken(filepath):
+    if not os.path.exists(filepath):
+        return None
+    with pa.memory_map(str(filepath), 'r') as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    token = metadata.get(b'store_token')
+    return None if token is None else token.decode()
+
+def toArray(values):
+    if values.dtype.kind == 'f': # NaN kept as a value, not a null
+        return pa.array(values.to_numpy(), from_pandas=False)
+    return pa.array(values) # DateTime and state (dictionary) columns
+
+def writeShared(df, token):
+    filepath = sharedFile()
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_arrays([toArray(df[col]) for col in df.columns], names=list(df.columns))
+    table = table.replace_schema_metadata({'store_token': token})
+    temp_path = filepath.with_name(filepath.name + "." + str(os.getpid()) + ".tmp") # workers may write at once
+    with pa.OSFile(str(temp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, filepath)
+
+def publish():
+    # Handle of the shared file, written from the store first if it is missing or out of date
+    token = storeToken()
+    if token is None:
+        return None
+    if fileToken(sharedFile()) != token:
+        print("Writing shared all_data file...")
+        df = DataStore.loadAllData()
+        if config.compact:
+            df = Compact.compactAllData(df)
+        writeShared(df, token)
+    return Handle(sharedFile(), token)
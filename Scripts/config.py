@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import datetime
 from pytz import utc
@@ -5,7 +6,23 @@ from pytz import utc
 io_dir = Path.home()
 port = 8050
 update = False
+refresh = False
+workers = 1 # number of import worker processes
+batch_files = 0 # number of files per streamed import batch, 0 imports all files in memory
 verbose = False
+compact = False # hold declared float32 and bar (state) columns of all_data compactly in memory (--compact)
+live_interval = 0 # seconds between checks for new data files while the app runs (--live), 0 disables live ingest
+shared = False # share all_data (memory mapped) and job states between the app's worker processes (set by wsgi.py)
+store_format = 'parquet' # all_data storage format: parquet, feather or pbz2
+store_compression = 'zstd' # parquet compression codec
+point_budget = 2800 # target number of points per trace for high resolution and downsampled charts
+chart_cache_mb = 256 # memory limit of the chart data and figure cache in MB
+job_workers = 2 # number of chart and export jobs run at once
+render_workers = min(4, os.cpu_count() or 1) # number of Kaleido image renderers (chromium processes) for exports
+render_warm = True # start the image renderers when the app starts
+data_export_format = 'csv' # chart data export format: csv, csv.gz, csv.zst or parquet
+export_chunk_rows = 100000 # rows written at a time by data exports
+html_point_budget = 0 # max points per trace in html exports (min/max per time bucket), 0 keeps every point
 
 # Default config
 config = {}
@@ -13,6 +30,7 @@ config['info'] = {}
 config['project'] = ""
 config['date_start'] = datetime(2020, 1, 1, 0, 0, 0, tzinfo=utc)
 config['date_end'] = datetime(2020, 1, 1, 1, 0, 0, tzinfo=utc)
+config['date_end_fixed'] = False # date_end set in the setup sheet (else the time of the last data import)
 config['plot_sets'] = [] #plot_set ids list
 config['plot_set_plots'] = {} # dict of plot_sets containing plots + trace names
 config['selected_pars'] = [] # list of every par
@@ -25,17 +43,25 @@ config['pdf_size_dict'] = {}
 config['png_size_dict'] = {}
 
 importer = {}
-importer['files_imported'] = {} # dict of dataset: filenames
+importer['manifest'] = {} # dict of file path: imported file record
 importer['selected_datasets'] = [] # list of datasets used
 importer['filetypes'] = [] # list of filetypes
+importer['supporting_data'] = {} # dict of (dataset, folder): supporting data for import workers
+importer['import_errors'] = [] # list of files which failed to import
+importer['reimport_windows'] = [] # list of (first, last) DateTime ranges of the previous rows of changed files
+importer['rep_groups'] = {} # dict of parameter: parameter_ave and parameter_ave: replicate parameters
 
 data = {}
 data['dataset_data'] = {} # Individual data df
 data['supporting_data_dict'] = {} # Supporting dataframe store
-data['all_data'] = None # Master all data df
+data['all_data'] = None # Master all data df (set with DataAccess.setAllData)
+data['all_data_epoch'] = None # int64 epoch (ns) array of all_data DateTime
+data['all_data_handle'] = None # SharedData.Handle of the memory mapped all_data (config.shared)
+data['all_data_version'] = 0 # incremented whenever all_data is replaced
 
 figs = {}
-figs['plot_figs'] = {} # dict of plot_code:Figure
-figs['dcc_plot_figs'] = {} # list of dcc Graphs
+figs['plot_figs'] = {} # dict of plot_code:Figure (CreateCharts only)
+figs['dcc_plot_figs'] = [] # list of dcc Graphs (CreateCharts only, saved as templates by ConfigStore)
+figs['plot_templates'] = {} # dict of graphX:plain dict figure and style (loaded by Functions.plotTemplate)
 
 components = {}
\ No newline at end of file
@@ -1,40 +1,40 @@
-import os
-import pickle
-import bz2
-
 from pytz import timezone
 from datetime import datetime
-from threading import Timer
+from threading import Timer, Thread
 import dash_bootstrap_components as dbc
-from dash_extensions.enrich import Output, Dash, Trigger, FileSystemCache
+from dash_extensions.enrich import Output, Dash, Trigger
 
 import Scripts.config as config
 import Scripts.ProcessData_resampler as ProcessData
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+import Scripts.SharedData as SharedData
+import Scripts.MetaIndex as MetaIndex
+import Scripts.ConfigStore as ConfigStore
 import Scripts.CreateCharts as CreateCharts
 import Scripts.Functions as func
+import Scripts.Renderer as Renderer
+import Scripts.LiveIngest as LiveIngest
 import Scripts.Layout as Layout
 from Scripts.Callbacks  import register_callbacks
 
-def getConfigData(data = 'all_data.pbz2'):
-    dfile_path = config.io_dir / "Output" / data
-    pfile_path = config.io_dir / "Output" / 'sub_config2.pbz2'
-    if os.path.exists(dfile_path) and os.path.exists(pfile_path) and config.update:
-        print("Importing processed data from " + data + "...")
-        with bz2.open(dfile_path, 'rb') as pfile:
-            config.data['all_data'] = pickle.load(pfile)
+def getConfigData():
+    if DataStore.dataExists() and ConfigStore.configExists() and config.update and not config.refresh:
         print("Importing config...")
-        with bz2.open(pfile_path, 'rb') as pfile:
-            items = pickle.load(pfile)
-        for key in list(items[0].keys()):
-            config.config[key] = items[0][key]
-        for key in list(items[1].keys()):
-            config.figs[key] = items[1][key]
-    else:
-        if config.update:
-            print("No processed " + data + " or sub_config2.pbz2 files exist")
-        CreateCharts.main()
-        config.update = True
-        getConfigData()
+        if ConfigStore.loadConfig(): # figure templates are loaded when first used
+            MetaIndex.getIndex() # build the plot metadata index
+            print("Importing processed data...")
+            if config.shared: # memory mapped for all worker processes
+                handle = SharedData.publish()
+                DataAccess.setAllData(handle.frame(), handle)
+            else:
+                DataAccess.setAllData(DataStore.loadAllData())
+            return
+    elif config.update and not config.refresh:
+        print("No processed all_data or app_config files exist")
+    CreateCharts.main()
+    config.update = True
+    getConfigData()
 
 def main():
     global app
@@ -54,12 +54,10 @@ def main():
     config.components = Layout.prepare_layout() # Prepare layout
     app.layout = Layout.serve_layout
     register_callbacks(app) # Add callbacks
-
-    # Create a server side resource.
-    config.fsc = FileSystemCache("cache_dir")
-    config.fsc.set("submit_progress", None)
-    config.fsc_e = FileSystemCache("export_cache_dir")
-    config.fsc_e.set("export_progress", None)
+    if config.render_warm:
+        Thread(target=Renderer.warmUp, daemon=True).start() # start image renderers for exports
+    if config.live_interval > 0:
+        LiveIngest.start() # check for new data files in the background
 
     finish = datetime.now(timezone('UTC')).replace(microsecond=0)
     print("App ready at: " + str(finish) + " (" + str(finish - begin) + ")")
@@ -0,0 +1,48 @@
+# Benchmark of DateTime parsing in the import path
+# Compares joining the Date and Time strings and calling pd.to_datetime (the previous example import)
+# with DateTimes.parseDatetimes on the Example_TS_data files, as they are and repeated to the size of
+# a second resolution logger file.
+# Run from the TimeSeriesProcessor folder: python benchmarks/datetime_parsing.py [repeats]
+
+import sys
+import time
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import Scripts.DateTimes as DateTimes
+
+def previousParse(df):
+    datetimes = pd.to_datetime(df['Date'] + " " + df['Time'], format='%d/%m/%Y %H:%M:%S')
+    return datetimes.dt.tz_localize('UTC')
+
+def newParse(df):
+    return DateTimes.parseDatetimes(df['Date'], tz='UTC', times=df['Time'])
+
+def best(function, df, loops = 5):
+    times = []
+    for i in range(loops):
+        start = time.perf_counter()
+        function(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data_folder = Path(__file__).resolve().parents[1] / "Example" / "Example_TS_data"
+    files = [pd.read_csv(filepath, usecols=['Date', 'Time']) for filepath in sorted(data_folder.glob("*.csv"))]
+    combined = pd.concat(files, ignore_index=True)
+    large = pd.concat([combined] * repeats, ignore_index=True)
+    assert newParse(large).equals(previousParse(large))
+
+    print("Rows          Previous (s)  New (s)  Speedup")
+    previous = sum(best(previousParse, df) for df in files)
+    new = sum(best(newParse, df) for df in files)
+    print(f"{len(combined):<12}  {previous:>12.4f}  {new:>7.4f}  {previous / new:>6.1f}x  ({len(files)} files)")
+    for df in [combined, large]:
+        previous = best(previousParse, df)
+        new = best(newParse, df)
+        print(f"{len(df):<12}  {previous:>12.4f}  {new:>7.4f}  {previous / new:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
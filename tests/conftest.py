@@ -0,0 +1,59 @@
+import sys
+import shutil
+import importlib
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO))
+
+import Scripts.config as config
+
+
+@pytest.fixture
+def io_dir(tmp_path, monkeypatch):
+    # Empty io_dir with an Output folder, set as config.io_dir for the test
+    (tmp_path / "Output").mkdir()
+    monkeypatch.setattr(config, "io_dir", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fresh_config():
+    # config globals as at import, for tests that set all_data or other module state
+    importlib.reload(config)
+    yield config
+    importlib.reload(config)
+
+
+@pytest.fixture
+def example(tmp_path, monkeypatch, fresh_config):
+    # Copy of the Example folder as the working directory (its Info2.xlsx has relative data folder paths)
+    # with fresh config globals, returning the example project's io_dir
+    shutil.copytree(REPO / "Example", tmp_path / "Example", ignore=shutil.ignore_patterns("Output", "__pycache__"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "path", list(sys.path)) # ProcessData.setIOFolder adds the project's Scripts folder
+    sys.modules.pop("CustomDataImports", None)
+    config.io_dir = Path("Example") / "Example_project"
+    return config.io_dir
+
+
+def processData(*args):
+    # Run the data processing (ProcessData_resampler.main) on the example project with command line args
+    import Scripts.ProcessData_resampler as ProcessData
+    argv = sys.argv
+    sys.argv = ["ProcessData_resampler.py", "--io_dir", str(config.io_dir)] + list(args)
+    try:
+        ProcessData.main()
+    finally:
+        sys.argv = argv
+
+
+def holdFiles(folder, count, hold):
+    # Move the last count data files of folder to hold, returning their names
+    hold.mkdir(exist_ok=True)
+    names = sorted(path.name for path in folder.iterdir())[-count:]
+    for name in names:
+        shutil.move(str(folder / name), str(hold / name))
+    return names
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import Scripts.config as config
+import Scripts.DataAccess as DataAccess
+
+
+def sampleData(rows = 1000):
+    datetimes = pd.date_range('2023-01-01', periods=rows, freq='1min', tz='UTC')
+    return pd.DataFrame({'DateTime': datetimes, 'a': np.arange(rows, dtype=float), 'b': np.arange(rows, dtype=float) * 2})
+
+
+def test_range_slice_matches_query(fresh_config):
+    df = sampleData()
+    DataAccess.setAllData(df)
+    start, end = df['DateTime'].iloc[100], df['DateTime'].iloc[200]
+    expected = df[(df['DateTime'] > start) & (df['DateTime'] < end)]
+    sliced = DataAccess.rangeSlice(start, end, ['DateTime', 'b'])
+    pd.testing.assert_frame_equal(sliced.reset_index(drop=True), expected[['DateTime', 'b']].reset_index(drop=True))
+    assert DataAccess.rangeCount(start, end) == len(expected)
+    chunks = list(DataAccess.rangeChunks(start, end, ['DateTime', 'a'], 30))
+    assert [len(chunk) for chunk in chunks] == [30, 30, 30, 9]
+    pd.testing.assert_frame_equal(pd.concat(chunks).reset_index(drop=True), expected[['DateTime', 'a']].reset_index(drop=True))
+
+
+def test_replaced_all_data_is_indexed_once(fresh_config, monkeypatch, capsys):
+    monkeypatch.setattr(config, 'compact', True)
+    DataAccess.setAllData(sampleData())
+    assert capsys.readouterr().out.count("Compact all_data") == 1
+    version = config.data['all_data_version']
+    config.data['all_data'] = sampleData(500) # replaced without setAllData
+    assert len(DataAccess.epochIndex()) == 500
+    assert config.data['all_data_version'] == version + 1
+    assert capsys.readouterr().out == "" # not compacted again
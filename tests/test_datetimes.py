@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+import Scripts.DateTimes as DateTimes
+
+
+def test_date_and_time_columns():
+    dates = pd.Series(['01/02/2023', '01/02/2023', '13/02/2023'])
+    times = pd.Series(['00:00:00', '12:30:15', '23:59:59'])
+    parsed = DateTimes.parseDatetimes(dates, tz='UTC', dt_format='%d/%m/%Y', times=times, time_format='%H:%M:%S')
+    expected = pd.to_datetime(dates + " " + times, format='%d/%m/%Y %H:%M:%S').dt.tz_localize('UTC')
+    pd.testing.assert_series_equal(parsed, expected, check_names=False)
+    assert parsed.iloc[0].month == 2 # day first as given
+
+
+def test_timezone_converted_to_utc():
+    parsed = DateTimes.parseDatetimes(pd.Series(['01/07/2023 12:00', '01/12/2023 12:00']), tz='Europe/London', dt_format='%d/%m/%Y %H:%M')
+    assert list(parsed.dt.hour) == [11, 12]
+    assert str(parsed.dt.tz) == 'UTC'
+
+
+def test_missing_times_give_nat():
+    dates = pd.Series(['01/02/2023', '02/02/2023'])
+    parsed = DateTimes.parseDatetimes(dates, times=pd.Series([np.nan, np.nan]))
+    assert parsed.isna().all() and len(parsed) == 2
+    assert DateTimes.parseDatetimes(pd.Series([], dtype=object), times=pd.Series([], dtype=object)).empty
+
+
+def test_values_not_fixed_width_fall_back():
+    parsed = DateTimes.parseDatetimes(pd.Series(['2023-01-05 10:00:00.5', '2023-01-05 10:00:01.25']))
+    assert list(parsed.dt.microsecond) == [500000, 250000]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+import Scripts.config as config
+import Scripts.DataAccess as DataAccess
+import Scripts.Functions as func
+
+
+def sampleData(rows = 20000, seed = 1):
+    rng = np.random.default_rng(seed)
+    datetimes = pd.date_range('2023-01-01', periods=rows, freq='10s', tz='UTC')
+    df = pd.DataFrame({'DateTime': datetimes})
+    for col in ['a', 'b', 'c', 'd']:
+        df[col] = np.cumsum(rng.normal(size=rows))
+    df.loc[5000:5099, 'a'] = np.nan # gap between values
+    df.loc[:199, 'b'] = np.nan # missing before the first value, not a gap
+    df['c_err'] = np.abs(df['c']) / 10
+    return df
+
+
+def test_each_trace_within_budget():
+    df = sampleData()
+    x = df['DateTime'].values
+    budget = 100
+    for col in ['a', 'b', 'c', 'd']:
+        kept_x, arrays = DataAccess.decimate(x, {'y': df[col].to_numpy()}, budget)
+        y = arrays['y']
+        assert len(kept_x) <= budget + 3 # first and last rows and one gap
+        assert np.nanmax(y) == df[col].max() and np.nanmin(y) == df[col].min()
+        assert kept_x[0] == x[0] and kept_x[-1] == x[-1]
+        assert np.all(np.diff(kept_x.astype(np.int64)) > 0)
+
+
+def test_gap_kept_once():
+    df = sampleData()
+    x = df['DateTime'].values
+    kept_x, arrays = DataAccess.decimate(x, {'y': df['a'].to_numpy()}, 100)
+    gap = np.isnan(arrays['y'])
+    assert gap.sum() == 1
+    assert x[5000] <= kept_x[gap][0] <= x[5099]
+    kept_x, arrays = DataAccess.decimate(x, {'y': df['b'].to_numpy()}, 100)
+    assert np.isnan(arrays['y']).sum() == 1 # only the first row, no gap marker
+
+
+def test_error_arrays_follow_values():
+    df = sampleData()
+    kept_x, arrays = DataAccess.decimate(df['DateTime'].values, {'y': df['c'].to_numpy(), 'error_y': df['c_err'].to_numpy()}, 50)
+    np.testing.assert_array_equal(arrays['error_y'], np.abs(arrays['y']) / 10)
+
+
+def test_range_downsample_rows(fresh_config):
+    df = sampleData()
+    DataAccess.setAllData(df)
+    start, end = df['DateTime'].iloc[0] - pd.Timedelta(seconds=1), df['DateTime'].iloc[-1] + pd.Timedelta(seconds=1)
+    budget = 100
+    reduced = DataAccess.rangeDownsample(start, end, ['DateTime', 'a', 'b', 'c', 'c_err', 'd'], ['a', 'b', 'c', 'd'], budget)
+    assert len(reduced) < len(df)
+    # raw rows, holding every point each trace keeps
+    raw = df.set_index('DateTime').loc[reduced['DateTime']]
+    np.testing.assert_array_equal(raw[['a', 'b', 'c', 'd']].to_numpy(), reduced[['a', 'b', 'c', 'd']].to_numpy())
+    for col in ['a', 'b', 'c', 'd']:
+        from_raw = DataAccess.decimate(df['DateTime'].values, {'y': df[col].to_numpy()}, budget)
+        from_reduced = DataAccess.decimate(reduced['DateTime'].values, {'y': reduced[col].to_numpy()}, budget)
+        assert set(from_raw[0]) <= set(reduced['DateTime'].values)
+        assert np.nanmax(from_reduced[1]['y']) == df[col].max() and np.nanmin(from_reduced[1]['y']) == df[col].min()
+        assert len(from_reduced[0]) <= budget + 3
+
+
+def test_export_name_has_budget():
+    dates = [pd.Timestamp('2023-01-01', tz='UTC').timestamp(), pd.Timestamp('2023-01-20', tz='UTC').timestamp()]
+    plots = {'graph1': 'A', 'graph2': 'B'}
+    assert func.exportName(dates, 0, 2800, plots, 0) == '20230101-20230120_MinMax2800_P2'
+    assert func.exportName(dates, 0, 1400, plots, 1) == '20230101-20230120_MinMax1400_PS1'
+    assert func.exportName(dates, 15, 0, plots, 1) == '20230101-20230120_15Min_PS1'
@@ -0,0 +1,43 @@
+import io
+import re
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.pdf import PageObject
+from PyPDF2.generic import DecodedStreamObject, NameObject
+
+import Scripts.Functions as func
+
+
+def plotPdf(width, height):
+    # One page pdf with a filled rectangle, standing in for a rendered plot
+    writer = PdfFileWriter()
+    page = PageObject.createBlankPage(None, width, height)
+    contents = DecodedStreamObject()
+    contents.setData(b'q 0 0 1 rg 10 10 50 50 re f Q')
+    page[NameObject('/Contents')] = writer._addObject(contents)
+    writer.addPage(page)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    return pdf.getvalue()
+
+
+def test_place_command_has_no_exponent():
+    assert func.placeCommand('/Plot5', -0.0, -8.526512829121202e-14) == 'q 1 0 0 1 -0.0000 -0.0000 cm /Plot5 Do Q'
+
+
+def test_combined_pdf_content_stream(io_dir):
+    # Heights as made by exportImage (oheight / divisor), whose running offsets are not exact in floating point
+    divisor = 5 + 1.25
+    heights = [842 / divisor] * 5 + [842 / divisor * 1.25]
+    func.combinePDF([plotPdf(595, height) for height in heights], "combined")
+
+    page = PdfFileReader(str(io_dir / "Output" / "combined.pdf")).getPage(0)
+    commands = page.getContents().getData().decode('latin-1').split('\n')
+    assert len(commands) == len(heights)
+    number = r'-?\d+\.\d{4}'
+    for p, command in enumerate(commands):
+        assert re.fullmatch(r'q 1 0 0 1 %s %s cm /Plot%d Do Q' % (number, number, p), command)
+    offsets = [float(command.split()[5]) for command in commands]
+    assert offsets[-1] == 0
+    assert offsets == sorted(offsets, reverse=True)
+    assert sorted(page['/Resources']['/XObject'].keys()) == sorted('/Plot' + str(p) for p in range(len(heights)))
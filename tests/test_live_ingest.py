@@ -0,0 +1,110 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import Scripts.config as config
+import Scripts.ProcessData_resampler as ProcessData
+import Scripts.ImportManifest as ImportManifest
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+import Scripts.Pyramid as Pyramid
+import Scripts.Compact as Compact
+import Scripts.LiveIngest as LiveIngest
+
+from conftest import processData, holdFiles
+
+
+def test_ingest_while_charts_read(example, tmp_path, monkeypatch):
+    ts_folder = Path("Example") / "Example_TS_data"
+    held = holdFiles(ts_folder, 6, tmp_path / "hold")
+    processData()
+    DataAccess.setAllData(DataStore.loadAllData())
+    ProcessData.setIOFolder(config.io_dir)
+    ProcessData.selectDatasets()
+    ImportManifest.loadManifest()
+    first, last = DataAccess.dateExtent()
+    before = len(config.data['all_data'])
+    pars = ['TEMP_A', 'A1_V']
+
+    for name in held:
+        shutil.move(str(tmp_path / "hold" / name), str(ts_folder / name))
+
+    stop = threading.Event()
+    errors = []
+    reads = []
+    def read():
+        # Charts of the whole range while ingesting: every read sees one version of all_data and the levels
+        try:
+            while not stop.is_set():
+                read_start = time.time()
+                end = pd.Timestamp('2023-01-22', tz='UTC')
+                with DataAccess.lock.reading(): # both from the same version
+                    raw = DataAccess.rangeSlice(first - pd.Timedelta(minutes=1), end, ['DateTime'] + pars)
+                    resampled = Pyramid.resampleRange(first - pd.Timedelta(minutes=1), end, pars, 60, 60)
+                assert len(raw) in (before, len(config.data['all_data']))
+                assert resampled.index[-1] <= raw['DateTime'].iloc[-1]
+                reads.append((len(raw), read_start, time.time()))
+        except Exception as e:
+            errors.append(e)
+    build_reads = []
+    buildPyramid = Pyramid.buildPyramid
+    def countedBuild(*args, **kwargs):
+        # Reads made while the levels are built
+        build_start = time.time()
+        buildPyramid(*args, **kwargs)
+        build_reads.append(sum(1 for rows, start, end in list(reads) if build_start < start and end < time.time()))
+    monkeypatch.setattr(Pyramid, 'buildPyramid', countedBuild)
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    time.sleep(0.2)
+    begin = time.time()
+    assert LiveIngest.ingest()
+    ingest_time = time.time() - begin
+    time.sleep(0.2)
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert ingest_time < 60
+    assert len(build_reads) == 1 and build_reads[0] > 0 # charts are not held up by the level build
+    assert set(rows for rows, start, end in reads) == {before, len(config.data['all_data'])}
+    assert DataAccess.dateExtent()[1] > last
+    assert not (config.io_dir / "Output" / "pyramid_next").exists()
+
+    # The same all_data and levels as a full import of every file
+    live = Compact.floatFrame(config.data['all_data'])
+    live_level = list(DataStore.iterPartitions(folder=Pyramid.levelFolder(60)))
+    shutil.rmtree(config.io_dir / "Output")
+    processData()
+    full = DataStore.loadAllData()
+    pd.testing.assert_frame_equal(live[full.columns].reset_index(drop=True), full.reset_index(drop=True), check_dtype=False)
+    full_level = list(DataStore.iterPartitions(folder=Pyramid.levelFolder(60)))
+    pd.testing.assert_frame_equal(pd.concat(live_level, ignore_index=True), pd.concat(full_level, ignore_index=True), check_dtype=False)
+
+
+def test_waiting_writer_stops_new_reads():
+    lock = DataAccess.RWLock()
+    stop = threading.Event()
+    def read():
+        while not stop.is_set():
+            with lock.reading():
+                with lock.reading(): # nested reads do not wait for the writer
+                    time.sleep(0.01)
+    readers = [threading.Thread(target=read) for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    time.sleep(0.1)
+    begin = time.time()
+    with lock.writing():
+        with lock.reading(): # the writer can read
+            waited = time.time() - begin
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert waited < 1
+    assert lock.readers == 0 and lock.writers_waiting == 0 and lock.writer is None
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+import Scripts.config as config
+import Scripts.ProcessData_resampler as ProcessData
+
+
+def setInfo(**settings):
+    datasets = pd.DataFrame(dict({'folder': [1]}, **{key: [value] for key, value in settings.items()}), index=pd.Index(['Logger'], name='dataset'))
+    parameters = pd.DataFrame({'code': ['T1', 'T2'], 'parameter': ['TEMP_1', 'TEMP_2']}, index=pd.Index(['Logger', 'Logger'], name='dataset'))
+    config.config['info'] = {'datasets': datasets, 'parameters': parameters}
+    config.config['selected_pars'] = ['TEMP_1']
+    ProcessData.read_options.clear()
+
+
+def test_padded_pyarrow_engine(fresh_config):
+    setInfo(dtype=' float32', usecols='Date, Time', engine='pyarrow ')
+    options = ProcessData.readOptions('Logger', 1)
+    assert options['engine'] == 'pyarrow'
+    assert options['usecols'] == ['Date', 'Time', 'T1']
+    assert options['dtype'] == {'T1': np.dtype('float32')}
+
+
+def test_other_engines_filter_columns(fresh_config):
+    setInfo(usecols='Date,Time', engine=' c')
+    options = ProcessData.readOptions('Logger', 1)
+    assert options['engine'] == 'c'
+    assert [col for col in ['Date', 'Time', 'T1', 'T2'] if options['usecols'](col)] == ['Date', 'Time', 'T1']
+    assert 'engine' not in ProcessData.readOptions('Logger', 1, 'excel')
@@ -0,0 +1,14 @@
+import pytest
+
+import Scripts.Renderer as Renderer
+
+
+def test_failed_scope_frees_its_slot(monkeypatch):
+    def failingScope(**kwargs):
+        raise RuntimeError("kaleido failed to start")
+    monkeypatch.setattr(Renderer, 'PlotlyScope', failingScope)
+    monkeypatch.setattr(Renderer, 'scope_count', 0)
+    for attempt in range(Renderer.config.render_workers + 1):
+        with pytest.raises(RuntimeError):
+            Renderer.getScope()
+    assert Renderer.scope_count == 0
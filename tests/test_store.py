@@ -0,0 +1,118 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Scripts.config as config
+import Scripts.DataStore as DataStore
+import Scripts.DataAccess as DataAccess
+import Scripts.Pyramid as Pyramid
+import Scripts.ImportManifest as ImportManifest
+
+from conftest import processData, holdFiles
+
+
+def sampleData(start = '2023-01-20', rows = 6000, seed = 2):
+    # Rows every 15 minutes over three months, with some missing values
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'DateTime': pd.date_range(start, periods=rows, freq='15min', tz='UTC'),
+                       'A': rng.normal(size=rows), 'B': rng.normal(size=rows)})
+    df.loc[rng.choice(rows, rows // 20, replace=False), 'A'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('store_format', sorted(DataStore.store_formats))
+def test_store_round_trip(io_dir, store_format):
+    df = sampleData()
+    DataStore.saveAllData(df, store_format)
+    assert DataStore.readMeta()['format'] == store_format
+    assert sorted(DataStore.readMeta()['partitions']) == ['202301', '202302', '202303']
+    pd.testing.assert_frame_equal(DataStore.loadAllData(), df)
+    start, end = pd.Timestamp('2023-02-10', tz='UTC'), pd.Timestamp('2023-03-01', tz='UTC')
+    expected = df[(df['DateTime'] >= start) & (df['DateTime'] <= end)][['DateTime', 'B']].reset_index(drop=True)
+    pd.testing.assert_frame_equal(DataStore.loadAllData(['DateTime', 'B'], start, end), expected)
+
+
+def test_store_update_rewrites_from_month(io_dir):
+    df = sampleData()
+    DataStore.saveAllData(df)
+    first_file = DataStore.storeFolder() / DataStore.readMeta()['partitions']['202301']['file']
+    first_written = os.stat(first_file).st_mtime_ns
+
+    updated = pd.concat([df, sampleData('2023-04-21', 200, seed=3)], ignore_index=True)
+    updated.loc[updated['DateTime'] >= '2023-02-15', 'B'] += 1
+    DataStore.saveAllData(updated, since=pd.Timestamp('2023-02-15', tz='UTC'))
+    assert os.stat(first_file).st_mtime_ns == first_written # earlier months not rewritten
+    assert sorted(DataStore.readMeta()['partitions']) == ['202301', '202302', '202303', '202304']
+    pd.testing.assert_frame_equal(DataStore.loadAllData(), updated)
+
+
+def test_pyramid_levels(io_dir, fresh_config):
+    config.io_dir = io_dir
+    df = sampleData()
+    DataStore.saveAllData(df)
+    Pyramid.buildPyramid()
+    DataAccess.setAllData(df)
+    start, end = pd.Timestamp('2023-01-25 10:07', tz='UTC'), pd.Timestamp('2023-03-03 17:52', tz='UTC')
+    for resample in [60, 180, 1440]:
+        raw = df[(df['DateTime'] > start) & (df['DateTime'] < end)].set_index('DateTime')
+        expected = raw.groupby(pd.Grouper(freq=str(resample) + 'Min')).aggregate(np.mean).dropna(thresh=1)
+        resampled = Pyramid.resampleRange(start, end, ['A', 'B'], resample, Pyramid.levelFor(resample))
+        pd.testing.assert_frame_equal(resampled, expected, check_freq=False, check_names=False)
+
+    # Levels updated from a month match levels built from scratch
+    updated = df.copy()
+    updated.loc[updated['DateTime'] >= '2023-03-01', 'A'] *= 2
+    DataStore.saveAllData(updated, since=pd.Timestamp('2023-03-01', tz='UTC'))
+    Pyramid.buildPyramid(since=pd.Timestamp('2023-03-01', tz='UTC'))
+    levels = {level: pd.concat(DataStore.iterPartitions(folder=Pyramid.levelFolder(level)), ignore_index=True)
+              for level in Pyramid.PYRAMID_LEVELS}
+    shutil.rmtree(Pyramid.pyramidFolder())
+    Pyramid.buildPyramid()
+    for level in Pyramid.PYRAMID_LEVELS:
+        pd.testing.assert_frame_equal(levels[level], pd.concat(DataStore.iterPartitions(folder=Pyramid.levelFolder(level)), ignore_index=True))
+
+
+def test_update_imports_new_and_changed_files(example, tmp_path):
+    ts_folder = Path("Example") / "Example_TS_data"
+    held = holdFiles(ts_folder, 3, tmp_path / "hold")
+    # The last file imported starts half written, with its first status values blank
+    changing = sorted(os.listdir(ts_folder))[-1]
+    whole = pd.read_csv(ts_folder / changing, dtype=str)
+    for col in [col for col in whole.columns if 'Status' in col]:
+        whole.loc[:19, col] = ''
+    whole.iloc[:len(whole) // 2].to_csv(ts_folder / changing, index=False)
+    processData()
+    before = DataStore.loadAllData()
+
+    whole.to_csv(ts_folder / changing, index=False)
+    for name in held:
+        shutil.move(str(tmp_path / "hold" / name), str(ts_folder / name))
+    processData("--update")
+    updated = DataStore.loadAllData()
+    ImportManifest.loadManifest()
+    records = config.importer['manifest'].values()
+    assert len(records) == len(os.listdir(ts_folder)) + 1 # and the sample log
+    assert all('first' in record and 'last' in record for record in records)
+
+    shutil.rmtree(config.io_dir / "Output")
+    processData()
+    full = DataStore.loadAllData()
+    assert len(before) < len(updated) == len(full)
+    pd.testing.assert_frame_equal(updated[['DateTime']], full[['DateTime']])
+    # Only the forward filled status values at the start of the re-read file can differ
+    status = [col for col in full.columns if 'STATUS' in col]
+    other = [col for col in full.columns if col not in status]
+    pd.testing.assert_frame_equal(updated[other], full[other])
+
+
+def test_update_without_changes(example):
+    processData()
+    stored = DataStore.loadAllData()
+    saved = DataStore.readMeta()['saved']
+    processData("--update")
+    assert DataStore.readMeta()['saved'] == saved # nothing rewritten
+    pd.testing.assert_frame_equal(DataStore.loadAllData(), stored)
@@ -0,0 +1,32 @@
+# WSGI entry point for serving the app to several users with multiple worker processes, e.g.
+#   TSP_IO_DIR="path/to/project_folder" gunicorn --workers 4 --preload --bind 0.0.0.0:8050 wsgi:server
+# The options are set with environment variables instead of command line arguments:
+#   TSP_IO_DIR: the project folder containing Info2.xlsx (required)
+#   TSP_REFRESH: 1 to fetch new data before serving (as --refresh)
+#   TSP_COMPACT: 1 to hold all_data compactly in memory (as --compact)
+#   TSP_JOB_WORKERS: number of chart and export jobs each worker process runs at once
+# all_data is memory mapped from Output/shared/all_data.arrow and the background job states are kept in
+# Temp/jobs, so the worker processes share one copy of the data and any of them can answer a job poll.
+# With --preload the data is processed (if needed) and loaded once before the workers are started.
+
+import os
+import sys
+
+import Scripts.config as config
+import app as dash_app
+
+config.shared = True
+config.render_warm = False # each worker process starts its image renderers when first used
+if 'TSP_JOB_WORKERS' in os.environ:
+    config.job_workers = int(os.environ['TSP_JOB_WORKERS'])
+
+server_argv = sys.argv
+sys.argv = [__file__, "--io_dir", os.environ['TSP_IO_DIR'], "--update"] # as the app.py command line
+if os.environ.get('TSP_REFRESH', '0') == '1':
+    sys.argv.append("--refresh")
+if os.environ.get('TSP_COMPACT', '0') == '1':
+    sys.argv.append("--compact")
+dash_app.main()
+sys.argv = server_argv
+
+server = dash_app.app.server